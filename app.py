@@ -1,16 +1,32 @@
 import os
+import asyncio
 import uvicorn
 
-from modules_scan.core_links import init_db
+from modules_scan.core_links import init_db, aclose_async_redis, listen_token_invalidations
+from modules_scan.http_client import aclose_async_client
 from modules_app.app_setup import create_app
 from modules_app.routes import router as routes_router
 
 app = create_app()
 app.include_router(routes_router)
 
+_background_tasks = set()
+
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     init_db()
+    # Invalidação do cache local de tokens publicada pelo scanner/outros workers
+    task = asyncio.get_running_loop().create_task(listen_token_invalidations())
+    _background_tasks.add(task)
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for task in _background_tasks:
+        task.cancel()
+    _background_tasks.clear()
+    # Fecha os pools async (HTTP e Redis) do event loop do worker
+    await aclose_async_client()
+    await aclose_async_redis()
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("APP_PORT")), reload=False)
\ No newline at end of file
@@ -0,0 +1 @@
+# Benchmarks (python -m bench.<nome>); não fazem parte do app nem do scanner.
@@ -0,0 +1,149 @@
+# bench/common.py
+"""
+Utilitários compartilhados pelos benchmarks: conexão Redis (real ou
+fakeredis), contagem de idas ao Redis, estatísticas e gravação do resultado.
+
+Os benchmarks gravam chaves no Redis: use um banco dedicado (BENCH_REDIS_URL,
+padrão redis://localhost:6379/15), nunca o de produção.
+"""
+
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_OUTPUT = "bench_output.txt"
+BENCH_REDIS_URL = os.getenv("BENCH_REDIS_URL", "redis://localhost:6379/15")
+
+
+def bench_env(**overrides: Any) -> Dict[str, str]:
+    """
+    Variáveis de ambiente para o app/scanner sob benchmark. Precisa ser
+    aplicado (os.environ.update) ANTES de importar modules_scan/modules_app.
+    """
+    env = {
+        "REDIS_URL": BENCH_REDIS_URL,
+        "SCANNER_METRICS_PORT": "0",
+        "OUTBOX_INLINE_WORKER": "0",
+        "SCAN_SHARDING": "0",
+        "WEBHOOK_SECRET": "",
+    }
+    env.update({k: str(v) for k, v in overrides.items()})
+    return env
+
+
+def install_fakeredis():
+    """
+    Troca os clientes Redis (sync e async, por event loop) por fakeredis em
+    memória, compartilhando um único servidor.
+    """
+    import asyncio
+    import weakref
+
+    import fakeredis
+    import fakeredis.aioredis
+
+    from modules_scan import core_links
+    from modules_app import photo_cache, qr_render, status_cache
+
+    server = fakeredis.FakeServer()
+    core_links.r = fakeredis.FakeRedis(server=server, decode_responses=True)
+    clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def get_async_redis():
+        loop = asyncio.get_running_loop()
+        client = clients.get(loop)
+        if client is None:
+            client = clients[loop] = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        return client
+
+    for module in (core_links, status_cache, qr_render, photo_cache):
+        module.get_async_redis = get_async_redis
+    return server
+
+
+def make_redis(fake: bool):
+    if fake:
+        import fakeredis
+
+        return fakeredis.FakeRedis(decode_responses=True)
+    import redis
+
+    return redis.Redis.from_url(BENCH_REDIS_URL, decode_responses=True)
+
+
+def count_round_trips(client, rtt_ms: float = 0.0) -> Dict[str, int]:
+    """
+    Instrumenta o cliente: cada comando avulso ou pipeline conta como 1 ida
+    (e, com rtt_ms, espera esse tempo para simular a latência de rede).
+    """
+    counter = {"n": 0}
+    delay = rtt_ms / 1000.0
+
+    def hit():
+        counter["n"] += 1
+        if delay:
+            time.sleep(delay)
+
+    execute_command = client.execute_command
+
+    def counted_execute_command(*args, **options):
+        hit()
+        return execute_command(*args, **options)
+
+    pipeline = client.pipeline
+
+    def counted_pipeline(*args, **kwargs):
+        p = pipeline(*args, **kwargs)
+        execute = p.execute
+
+        def counted_execute(*a, **kw):
+            hit()
+            return execute(*a, **kw)
+
+        p.execute = counted_execute
+        return p
+
+    client.execute_command = counted_execute_command
+    client.pipeline = counted_pipeline
+    return counter
+
+
+def histogram_totals(histogram, **labels) -> Dict[str, float]:
+    """
+    Soma e contagem de uma série de metrics.Histogram (sem passar pelo /metrics).
+    """
+    with histogram._lock:
+        series = histogram._series.get(histogram._key(labels))
+        return {"sum": series[-2], "count": series[-1]} if series else {"sum": 0.0, "count": 0}
+
+
+def summarize(samples_s: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_s)
+    if not ordered:
+        return {"n": 0, "mean_us": 0.0, "p50_us": 0.0, "p99_us": 0.0}
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return {
+        "n": len(ordered),
+        "mean_us": statistics.fmean(ordered) * 1e6,
+        "p50_us": ordered[len(ordered) // 2] * 1e6,
+        "p99_us": p99 * 1e6,
+    }
+
+
+def write_report(title: str, lines: List[str], path: str = DEFAULT_OUTPUT,
+                 results: Optional[Dict[str, Any]] = None):
+    """
+    Imprime o relatório e o acrescenta ao arquivo de resultados; com `results`,
+    grava também uma linha JSON (para comparar execuções).
+    """
+    stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+    header = f"== {title} ({stamp}) =="
+    text = "\n".join([header, *lines, ""])
+    print(text)
+    if path:
+        with open(path, "a", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+            if results is not None:
+                fh.write("json " + json.dumps({"bench": title, "at": stamp, **results}, ensure_ascii=False) + "\n\n")
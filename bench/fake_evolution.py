@@ -0,0 +1,195 @@
+# bench/fake_evolution.py
+"""
+Stub local da Evolution API com os endpoints usados pelo projeto:
+
+  GET    /instance/fetchInstances      (chave global: todas; chave da instância: só ela)
+  GET    /instance/connect/{name}      (conectada: state=open; senão: QR que muda a cada qr_rotate_s)
+  DELETE /instance/logout/{name}
+  POST   /message/sendText/{name}
+
+Latência (média + jitter), taxa de falha (HTTP 500) e tamanho da frota são
+configuráveis, inclusive com o servidor rodando (atributos da instância).
+
+  python -m bench.fake_evolution --instances 1000 --latency-ms 40 --failure-rate 0.01
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+class FakeEvolution:
+    def __init__(self, instances: int = 100, latency_ms: float = 20.0, jitter_ms: float = 5.0,
+                 failure_rate: float = 0.0, connected_ratio: float = 0.5, qr_rotate_s: float = 20.0,
+                 prefix: str = "bench-", global_key: str = "bench-global-key",
+                 host: str = "127.0.0.1", port: int = 0):
+        self.instances = instances
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.connected_ratio = connected_ratio
+        self.qr_rotate_s = qr_rotate_s
+        self.prefix = prefix
+        self.global_key = global_key
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+
+    # --- frota ----------------------------------------------------------------
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def name(self, i: int) -> str:
+        return f"{self.prefix}{i}"
+
+    def apikey(self, name: str) -> str:
+        return f"key-{name}"
+
+    def _index(self, name: str) -> Optional[int]:
+        if not name.startswith(self.prefix):
+            return None
+        try:
+            i = int(name[len(self.prefix):])
+        except ValueError:
+            return None
+        return i if 0 <= i < self.instances else None
+
+    def is_connected(self, i: int) -> bool:
+        return random.Random(i).random() < self.connected_ratio
+
+    def record(self, i: int) -> Dict[str, Any]:
+        name = self.name(i)
+        number = f"5511{i:08d}"
+        connected = self.is_connected(i)
+        return {
+            "name": name,
+            "token": self.apikey(name),
+            "number": number,
+            "connectionStatus": "open" if connected else "close",
+            "ownerJid": f"{number}@s.whatsapp.net" if connected else None,
+            "profileName": f"Bench {i}",
+            "profilePicUrl": None,
+        }
+
+    # --- servidor -------------------------------------------------------------
+
+    def start(self) -> "FakeEvolution":
+        threading.Thread(target=self._server.serve_forever, name="fake-evolution", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, endpoint: str):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, como a Evolution real
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code: int, body: Any):
+                data = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _simulate(self, endpoint: str) -> bool:
+                stub._count(endpoint)
+                delay = stub.latency_ms + random.uniform(-stub.jitter_ms, stub.jitter_ms)
+                if delay > 0:
+                    time.sleep(delay / 1000.0)
+                if stub.failure_rate and random.random() < stub.failure_rate:
+                    stub._count(f"{endpoint}:failed")
+                    self._send(500, {"error": "fake failure"})
+                    return False
+                return True
+
+            def _route(self, method: str):
+                path = self.path.split("?", 1)[0]
+                parts = path.strip("/").split("/")
+                apikey = self.headers.get("apikey") or ""
+
+                if method == "GET" and path == "/instance/fetchInstances":
+                    if not self._simulate("fetch_instances"):
+                        return
+                    if apikey == stub.global_key:
+                        body: List[Dict[str, Any]] = [stub.record(i) for i in range(stub.instances)]
+                    else:
+                        i = stub._index(apikey[len("key-"):]) if apikey.startswith("key-") else None
+                        body = [stub.record(i)] if i is not None else []
+                    return self._send(200, body)
+
+                if len(parts) == 3 and (method, parts[0], parts[1]) in (
+                        ("GET", "instance", "connect"), ("DELETE", "instance", "logout"), ("POST", "message", "sendText")):
+                    endpoint = parts[1].lower()
+                    if not self._simulate(endpoint):
+                        return
+                    i = stub._index(parts[2])
+                    if i is None:
+                        return self._send(404, {"error": "instance not found"})
+                    if endpoint == "connect":
+                        if stub.is_connected(i):
+                            return self._send(200, {"instance": {"instanceName": parts[2], "state": "open"}})
+                        slot = int(time.time() // stub.qr_rotate_s) if stub.qr_rotate_s > 0 else 0
+                        return self._send(200, {"pairingCode": None, "code": f"2@bench{i}x{slot},pk{i},cid{i}", "count": slot})
+                    if endpoint == "logout":
+                        return self._send(200, {"status": "SUCCESS"})
+                    return self._send(201, {"key": {"id": f"BENCH{time.time_ns()}"}, "status": "PENDING"})
+
+                self._send(404, {"error": "not found"})
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_DELETE(self):
+                self._route("DELETE")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                self._route("POST")
+
+        return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--instances", type=int, default=100)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--jitter-ms", type=float, default=5.0)
+    ap.add_argument("--failure-rate", type=float, default=0.0)
+    ap.add_argument("--connected-ratio", type=float, default=0.5)
+    ap.add_argument("--qr-rotate-s", type=float, default=20.0)
+    args = ap.parse_args()
+
+    stub = FakeEvolution(args.instances, args.latency_ms, args.jitter_ms, args.failure_rate,
+                         args.connected_ratio, args.qr_rotate_s, port=args.port).start()
+    print(f"[INFO] Evolution fake em {stub.base_url} (chave global: {stub.global_key})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# bench/http_load.py
+"""
+Vazão e latência (p50/p99) de /api/qr-status e /api/qr-png sob N pollers
+concorrentes, com o app apontando para o stub local da Evolution.
+
+Com Redis local (BENCH_REDIS_URL) o app sobe em um processo uvicorn separado;
+com --fake ele roda em uma thread deste processo sobre fakeredis (o gerador de
+carga disputa o GIL com o app, então use os números só para comparar rodadas).
+
+  python -m bench.http_load --pollers 50 --duration 10 --instances 20
+  python -m bench.http_load --fake --pollers 20 --duration 5
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from .common import BENCH_REDIS_URL, DEFAULT_OUTPUT, bench_env, summarize, write_report
+from .fake_evolution import FakeEvolution
+
+ENDPOINTS = ("/api/qr-status", "/api/qr-png", "/api/qr-png?format=svg")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(port: int, fake: bool, env: Dict[str, str]):
+    """
+    Sobe o app e retorna uma função que o encerra.
+    """
+    if fake:
+        import uvicorn
+        import app as app_module
+
+        server = uvicorn.Server(uvicorn.Config(app_module.app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, name="bench-uvicorn", daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        def stop():
+            server.should_exit = True
+            thread.join(timeout=10)
+        return stop
+
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    def stop():
+        proc.terminate()
+        proc.wait(timeout=10)
+    return stop
+
+
+async def _load(base: str, endpoint: str, tokens: List[str], pollers: int, duration: float):
+    import httpx
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    sep = "&" if "?" in endpoint else "?"
+    limits = httpx.Limits(max_connections=pollers, max_keepalive_connections=pollers)
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as client:
+        stop_at = time.perf_counter() + duration
+
+        async def poller():
+            while time.perf_counter() < stop_at:
+                url = f"{endpoint}{sep}t={random.choice(tokens)}"
+                started = time.perf_counter()
+                try:
+                    resp = await client.get(url)
+                    code = resp.status_code
+                except Exception:
+                    code = 0
+                latencies.append(time.perf_counter() - started)
+                statuses[code] = statuses.get(code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(poller() for _ in range(pollers)))
+        elapsed = time.perf_counter() - started
+
+    stats = summarize(latencies)
+    stats["rps"] = len(latencies) / elapsed if elapsed else 0.0
+    stats["ok"] = sum(n for code, n in statuses.items() if 200 <= code < 400)
+    stats["statuses"] = statuses
+    return stats
+
+
+def run(args):
+    stub = FakeEvolution(instances=max(args.instances * 4, 10), latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                         failure_rate=args.failure_rate, connected_ratio=0.5).start()
+    port = args.port or _free_port()
+    env = bench_env(
+        EVOLUTION_DOMAIN=stub.base_url,
+        EVOLUTION_GLOBAL_KEY=stub.global_key,
+        EVOLUTION_INSTANCE_NAME_ADMIN=stub.name(0),
+        EVOLUTION_INSTANCE_KEY_ADMIN=stub.apikey(stub.name(0)),
+    )
+    os.environ.update(env)
+
+    if args.fake:
+        from .common import install_fakeredis
+        install_fakeredis()
+    from modules_scan import core_links
+
+    # Links para instâncias em QR (as conectadas encurtariam o token no meio da medição)
+    names = [stub.name(i) for i in range(stub.instances) if not stub.is_connected(i)][: args.instances]
+    tokens = [core_links.get_or_create_connect_link(name, stub.apikey(name), 3600)[0] for name in names]
+
+    stop_server = _start_server(port, args.fake, {**os.environ, **env})
+    results = {}
+    try:
+        for endpoint in ENDPOINTS:
+            before = dict(stub.calls)
+            stats = asyncio.run(_load(f"http://127.0.0.1:{port}", endpoint, tokens, args.pollers, args.duration))
+            stats["upstream_connect"] = stub.calls.get("connect", 0) - before.get("connect", 0)
+            results[endpoint] = stats
+    finally:
+        stop_server()
+        stub.stop()
+
+    lines = [
+        f"redis={'fakeredis' if args.fake else BENCH_REDIS_URL} pollers={args.pollers} duração={args.duration}s "
+        f"instâncias={len(tokens)} latência={args.latency_ms}±{args.jitter_ms}ms falhas={args.failure_rate:.1%}",
+        f"{'endpoint':<26}{'req/s':>9}{'ok':>8}{'total':>8}{'p50 ms':>9}{'p99 ms':>9}{'upstream':>10}",
+    ]
+    for endpoint, st in results.items():
+        lines.append(f"{endpoint:<26}{st['rps']:>9.0f}{st['ok']:>8}{st['n']:>8}"
+                     f"{st['p50_us'] / 1000:>9.2f}{st['p99_us'] / 1000:>9.2f}{st['upstream_connect']:>10}")
+    write_report("http_load", lines, args.output, results={"params": vars(args), "endpoints": results})
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pollers", type=int, default=50, help="clientes concorrentes")
+    ap.add_argument("--duration", type=float, default=10.0, help="segundos por endpoint")
+    ap.add_argument("--instances", type=int, default=20, help="instâncias (tokens) distintas sendo consultadas")
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--jitter-ms", type=float, default=5.0)
+    ap.add_argument("--failure-rate", type=float, default=0.0)
+    ap.add_argument("--port", type=int, default=0)
+    ap.add_argument("--fake", action="store_true", help="app em thread sobre fakeredis")
+    ap.add_argument("--output", default=DEFAULT_OUTPUT)
+    run(ap.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# bench/startup.py
+"""
+Orçamento de cold start: tempo de import dos pontos de entrada (app, scan,
+worker) em processos novos, e verificação de que nada pesado ou com efeito
+colateral roda no import.
+
+Para cada alvo, mede a mediana de N imports em processos limpos e confere:
+  - tempo <= orçamento (--budget-<alvo>-ms)
+  - módulos pesados que o alvo não usa no startup não foram carregados
+    (qrcode/Pillow/requests no app; fastapi/httpx/qrcode/Pillow no scanner)
+  - nenhum cliente Redis foi criado no import (core_links.r continua None)
+
+Sai com código 1 se algum alvo estourar o orçamento ou falhar uma verificação
+(serve como checagem no CI).
+
+  python -m bench.startup
+  python -m bench.startup --runs 10 --budget-app-ms 800 --top 8
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+from .common import DEFAULT_OUTPUT, bench_env, write_report
+
+# alvo -> (módulo importado, módulos que não podem estar carregados após o import)
+TARGETS = {
+    "app": ("app", ("qrcode", "PIL", "requests", "modules_scan.core_loop")),
+    "scan": ("scan", ("fastapi", "httpx", "jinja2", "qrcode", "PIL")),
+    "worker": ("worker", ("fastapi", "httpx", "jinja2", "qrcode", "PIL", "modules_scan.core_loop")),
+}
+DEFAULT_BUDGETS_MS = {"app": 1000.0, "scan": 400.0, "worker": 400.0}
+
+RESULT_PREFIX = "BENCH_RESULT "
+
+_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+from modules_scan import core_links
+print({prefix!r} + json.dumps({{
+    "ms": elapsed * 1000,
+    "loaded": [m for m in {forbidden!r} if m in sys.modules],
+    "redis_client": core_links.r is not None,
+}}), flush=True)
+"""
+
+
+def _run_child(module: str, forbidden, env: Dict[str, str], importtime: bool = False) -> Dict[str, Any]:
+    code = _CHILD.format(module=module, forbidden=tuple(forbidden), prefix=RESULT_PREFIX)
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=120)
+    result = next((json.loads(line[len(RESULT_PREFIX):]) for line in proc.stdout.splitlines()
+                   if line.startswith(RESULT_PREFIX)), None)
+    if result is None:
+        raise RuntimeError(f"import de {module} falhou:\n{proc.stderr[-2000:]}")
+    if importtime:
+        result["importtime"] = proc.stderr
+    return result
+
+
+def _top_imports(importtime: str, n: int) -> List[str]:
+    """
+    Módulos de primeiro nível (importados direto pelo alvo) com maior tempo acumulado.
+    """
+    rows = []
+    for line in importtime.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # cabeçalho
+        # " nome" = o próprio alvo; "   nome" = import direto dele
+        if parts[2].startswith("   ") and not parts[2].startswith("    "):
+            rows.append((int(parts[1]), parts[2].strip()))
+    rows.sort(reverse=True)
+    return [f"{name} {us / 1000:.0f}ms" for us, name in rows[:n]]
+
+
+def run(args) -> int:
+    env = dict(os.environ)
+    env.update(bench_env())
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+
+    budgets = {"app": args.budget_app_ms, "scan": args.budget_scan_ms, "worker": args.budget_worker_ms}
+    lines = [
+        f"execuções={args.runs} python={sys.version.split()[0]}",
+        f"{'alvo':<8}{'mediana ms':>11}{'mín ms':>9}{'orçamento':>11}  resultado",
+    ]
+    results: Dict[str, Any] = {}
+    failed = False
+    for target in args.targets:
+        module, forbidden = TARGETS[target]
+        _run_child(module, forbidden, env)  # aquece o cache de bytecode/disco
+        runs = [_run_child(module, forbidden, env) for _ in range(args.runs)]
+        ms = [r["ms"] for r in runs]
+        median = statistics.median(ms)
+        problems = []
+        if median > budgets[target]:
+            problems.append("acima do orçamento")
+        loaded = sorted({m for r in runs for m in r["loaded"]})
+        if loaded:
+            problems.append("carregou " + ",".join(loaded))
+        if any(r["redis_client"] for r in runs):
+            problems.append("criou cliente Redis no import")
+        failed = failed or bool(problems)
+
+        lines.append(f"{target:<8}{median:>11.0f}{min(ms):>9.0f}{budgets[target]:>11.0f}  {'; '.join(problems) or 'ok'}")
+        if args.top:
+            top = _top_imports(_run_child(module, forbidden, env, importtime=True)["importtime"], args.top)
+            lines.append(f"{'':<8}maiores imports: {', '.join(top)}")
+        results[target] = {"median_ms": median, "min_ms": min(ms), "budget_ms": budgets[target], "problems": problems}
+
+    write_report("startup", lines, args.output, results={"params": vars(args), "targets": results})
+    return 1 if failed else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--targets", type=lambda s: s.split(","), default=list(TARGETS))
+    ap.add_argument("--runs", type=int, default=5, help="imports medidos por alvo (processos novos)")
+    ap.add_argument("--budget-app-ms", type=float, default=DEFAULT_BUDGETS_MS["app"])
+    ap.add_argument("--budget-scan-ms", type=float, default=DEFAULT_BUDGETS_MS["scan"])
+    ap.add_argument("--budget-worker-ms", type=float, default=DEFAULT_BUDGETS_MS["worker"])
+    ap.add_argument("--top", type=int, default=5, help="lista os N imports mais caros de cada alvo (0 = não)")
+    ap.add_argument("--output", default=DEFAULT_OUTPUT)
+    sys.exit(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# bench/sweep.py
+"""
+Tempo da varredura do scanner (main_loop) em função do tamanho da frota,
+contra o stub local da Evolution (bench.fake_evolution).
+
+Para cada tamanho, um processo filho roda main_loop até concluir a primeira
+varredura completa (todas as instâncias vencidas) e informa os tempos das
+fases (fetch_instances, cleanup, sweep) medidos pelas próprias métricas.
+
+  python -m bench.sweep --sizes 100,500,1000 --latency-ms 40 --concurrency 16
+  python -m bench.sweep --fake          # fakeredis no filho (sem Redis local)
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from .common import BENCH_REDIS_URL, DEFAULT_OUTPUT, bench_env, histogram_totals, write_report
+from .fake_evolution import FakeEvolution
+
+RESULT_PREFIX = "BENCH_RESULT "
+
+
+def child(fake: bool, timeout: float):
+    if fake:
+        from .common import install_fakeredis
+        install_fakeredis()
+
+    import threading
+
+    from modules_scan import core_loop, metrics
+
+    threading.Thread(target=core_loop.main_loop, name="bench-main-loop", daemon=True).start()
+
+    deadline = time.monotonic() + timeout
+    while histogram_totals(metrics.SWEEP_PHASE_SECONDS, phase="sweep")["count"] < 1:
+        if time.monotonic() >= deadline:
+            print(RESULT_PREFIX + json.dumps({"error": "timeout"}), flush=True)
+            return
+        time.sleep(0.05)
+
+    phases = {
+        phase: histogram_totals(metrics.SWEEP_PHASE_SECONDS, phase=phase)["sum"]
+        for phase in ("fetch_instances", "cleanup", "sweep", "status", "logout")
+    }
+    print(RESULT_PREFIX + json.dumps(phases), flush=True)
+
+
+def run(args):
+    stub = FakeEvolution(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, failure_rate=args.failure_rate,
+                         connected_ratio=args.connected_ratio).start()
+    run_id = time.strftime("%H%M%S")
+    rows = []
+    try:
+        for size in args.sizes:
+            # Nomes novos a cada execução: nada reaproveitado de rodadas anteriores
+            stub.instances = size
+            stub.prefix = f"bench-{run_id}-{size}-"
+            stub.calls.clear()
+
+            env = dict(os.environ)
+            env.update(bench_env(
+                EVOLUTION_DOMAIN=stub.base_url,
+                EVOLUTION_GLOBAL_KEY=stub.global_key,
+                EVOLUTION_INSTANCE_NAME_ADMIN=stub.name(0),
+                EVOLUTION_INSTANCE_KEY_ADMIN=stub.apikey(stub.name(0)),
+                SCAN_CONCURRENCY=args.concurrency,
+            ))
+            cmd = [sys.executable, "-m", "bench.sweep", "--child", "--timeout", str(args.timeout)]
+            if args.fake:
+                cmd.append("--fake")
+
+            started = time.monotonic()
+            proc = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=args.timeout + 30)
+            wall = time.monotonic() - started
+            result = next((json.loads(line[len(RESULT_PREFIX):]) for line in proc.stdout.splitlines()
+                           if line.startswith(RESULT_PREFIX)), None)
+            if not result or "error" in result:
+                print(f"[ERRO] Tamanho {size}: {result or proc.stderr[-2000:]}")
+                continue
+            rows.append({"instances": size, "wall_s": wall, "calls": dict(stub.calls), **result})
+    finally:
+        stub.stop()
+
+    lines = [
+        f"redis={'fakeredis' if args.fake else BENCH_REDIS_URL} latência={args.latency_ms}±{args.jitter_ms}ms "
+        f"falhas={args.failure_rate:.1%} conectadas={args.connected_ratio:.0%} concorrência={args.concurrency}",
+        f"{'instâncias':>10}{'fetch s':>9}{'cleanup s':>11}{'sweep s':>9}{'inst/s':>9}{'connect':>9}{'logout':>8}",
+    ]
+    for row in rows:
+        rate = row["instances"] / row["sweep"] if row["sweep"] else 0.0
+        lines.append(
+            f"{row['instances']:>10}{row['fetch_instances']:>9.2f}{row['cleanup']:>11.2f}{row['sweep']:>9.2f}"
+            f"{rate:>9.0f}{row['calls'].get('connect', 0):>9}{row['calls'].get('logout', 0):>8}"
+        )
+    write_report("sweep", lines, args.output, results={"params": {k: v for k, v in vars(args).items() if k != "child"}, "rows": rows})
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[100, 500, 1000])
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--jitter-ms", type=float, default=5.0)
+    ap.add_argument("--failure-rate", type=float, default=0.0)
+    ap.add_argument("--connected-ratio", type=float, default=0.5)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--timeout", type=float, default=600.0, help="limite por tamanho de frota (s)")
+    ap.add_argument("--fake", action="store_true", help="usa fakeredis no processo do scanner")
+    ap.add_argument("--output", default=DEFAULT_OUTPUT)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(args.fake, args.timeout)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
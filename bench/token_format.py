@@ -0,0 +1,123 @@
+# bench/token_format.py
+"""
+Memória por token no Redis: formato v1 (hash com payload JSON, expires_at,
+one_time, used_at) contra o v2 de core_links (campos planos p/i/k), e o
+resultado da migração v1 -> v2 (_MIGRATE_LUA) sobre os mesmos tokens.
+
+Com Redis real usa MEMORY USAGE (bytes alocados pela chave); com --fake
+(fakeredis não implementa MEMORY) informa só os bytes de campos + valores.
+
+  python -m bench.token_format -n 5000
+  python -m bench.token_format --fake
+"""
+
+import argparse
+import json
+import os
+import secrets
+import statistics
+from typing import Dict, List, Optional
+
+from .common import BENCH_REDIS_URL, DEFAULT_OUTPUT, bench_env, make_redis, write_report
+
+os.environ.update(bench_env())
+
+from modules_scan import core_links as cl  # noqa: E402  (depois do ambiente do benchmark)
+
+
+def write_v1(r, token: str, instance: str, apikey: str, ttl: int):
+    """
+    Token como gravado antes do formato v2.
+    """
+    key = cl._key_token(token)
+    r.hset(key, mapping={
+        "expires_at": str(cl._now() + ttl),
+        "payload": json.dumps({"page": "connect", "instance": instance, "apikey": apikey}, ensure_ascii=False),
+        "one_time": "0",
+        "used_at": "",
+    })
+    r.expire(key, ttl)
+
+
+def _apikey() -> str:
+    # Mesmo formato/tamanho de uma chave de instância da Evolution (UUID em maiúsculas)
+    h = secrets.token_hex(16).upper()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _memory_usage(r, key: str) -> Optional[int]:
+    try:
+        return r.memory_usage(key, samples=0)
+    except Exception:
+        return None
+
+
+def _measure(r, tokens: List[str]) -> Dict[str, float]:
+    field_bytes, memory = [], []
+    for tok in tokens:
+        key = cl._key_token(tok)
+        h = r.hgetall(key)
+        field_bytes.append(sum(len(k.encode()) + len(v.encode()) for k, v in h.items()))
+        usage = _memory_usage(r, key)
+        if usage is not None:
+            memory.append(usage)
+    return {
+        "field_bytes": statistics.fmean(field_bytes) if field_bytes else 0.0,
+        "memory_usage": statistics.fmean(memory) if memory else None,
+    }
+
+
+def run(n: int, fake: bool, output: str):
+    r = make_redis(fake)
+    cl.r = r
+    prefix = f"bench:{secrets.token_hex(4)}"
+    ttl = 600
+
+    v1 = [secrets.token_urlsafe(16) for _ in range(n)]
+    for i, tok in enumerate(v1):
+        write_v1(r, tok, f"{prefix}:a{i}", _apikey(), ttl)
+    v2 = [cl.get_or_create_connect_link(f"{prefix}:b{i}", _apikey(), ttl)[0] for i in range(n)]
+
+    before = _measure(r, v1)
+    current = _measure(r, v2)
+
+    migrate = r.register_script(cl._MIGRATE_LUA)
+    with r.pipeline(transaction=False) as p:
+        for tok in v1:
+            migrate(keys=[cl._key_token(tok)], client=p)
+        converted = sum(p.execute())
+    migrated = _measure(r, v1)
+
+    usage = "MEMORY USAGE" if before["memory_usage"] is not None else "indisponível (fakeredis)"
+    lines = [
+        f"tokens={n} redis={'fakeredis' if fake else BENCH_REDIS_URL} memória={usage}",
+        f"{'formato':<22}{'campos+valores B':>18}{'MEMORY USAGE B':>16}",
+    ]
+    for label, st in (("v1 (payload JSON)", before), ("v2 (campos planos)", current), ("v1 migrado -> v2", migrated)):
+        mem = f"{st['memory_usage']:>16.0f}" if st["memory_usage"] is not None else f"{'-':>16}"
+        lines.append(f"{label:<22}{st['field_bytes']:>18.1f}{mem}")
+    lines.append(f"migrados: {converted}/{n}")
+    write_report("token_format", lines, output,
+                 results={"params": {"n": n, "fake": fake}, "v1": before, "v2": current, "migrated": migrated})
+
+    # Remove as chaves criadas pelo benchmark
+    for tok in v1 + v2:
+        r.delete(cl._key_token(tok))
+    for key in r.scan_iter(match=f"*{prefix}:*", count=1000):
+        r.delete(key)
+    stale = [inst for inst in r.sscan_iter(cl.KEY_LINK_INSTANCES, match=f"{prefix}:*")]
+    if stale:
+        r.srem(cl.KEY_LINK_INSTANCES, *stale)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", "--tokens", type=int, default=2000)
+    ap.add_argument("--fake", action="store_true", help="usa fakeredis em memória")
+    ap.add_argument("--output", default=DEFAULT_OUTPUT, help="arquivo onde o resultado é acrescentado ('' = não grava)")
+    args = ap.parse_args()
+    run(args.tokens, args.fake, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# bench/token_scripts.py
+"""
+Compara o ciclo de vida do token (get-or-create, validate, shorten) entre a
+implementação anterior (vários comandos por operação) e os scripts Lua de
+core_links (1 ida atômica por operação): idas ao Redis e latência.
+
+  python -m bench.token_scripts                 # Redis de BENCH_REDIS_URL
+  python -m bench.token_scripts --fake --rtt-ms 0.5
+                                                # fakeredis + RTT simulado por ida
+"""
+
+import argparse
+import json
+import os
+import secrets
+import time
+from typing import Callable, List
+
+from .common import BENCH_REDIS_URL, DEFAULT_OUTPUT, bench_env, count_round_trips, make_redis, summarize, write_report
+
+os.environ.update(bench_env())
+
+from modules_scan import core_links as cl  # noqa: E402  (depois do ambiente do benchmark)
+
+
+# --- implementação anterior (antes dos scripts Lua), para comparação ---------
+
+def legacy_get_or_create(r, instance: str, apikey: str, ttl: int) -> str:
+    key_active = cl._key_connect_active(instance)
+    tok = r.get(key_active)
+    if tok and r.exists(cl._key_token(tok)):
+        h = r.hgetall(cl._key_token(tok))
+        pl = json.loads(h.get("payload") or "{}") if h else {}
+        if pl.get("page") == "connect" and pl.get("instance") == instance:
+            return tok
+    elif tok:
+        r.delete(key_active)
+
+    tok = secrets.token_urlsafe(16)
+    key = cl._key_token(tok)
+    with r.pipeline(transaction=True) as p:
+        p.hset(key, mapping={
+            "expires_at": str(cl._now() + ttl),
+            "payload": json.dumps({"page": "connect", "instance": instance, "apikey": apikey}),
+            "one_time": "0",
+            "used_at": "",
+        })
+        p.expire(key, ttl)
+        p.sadd(cl._key_instance_tokens(instance), tok)
+        p.expire(cl._key_instance_tokens(instance), ttl)
+        p.sadd(cl.KEY_LINK_INSTANCES, instance)
+        p.execute()
+    if r.set(key_active, tok, ex=ttl, nx=True):
+        return tok
+    return r.get(key_active) or tok
+
+
+def legacy_validate(r, token: str) -> bool:
+    key = cl._key_token(token)
+    if not r.exists(key):
+        return False
+    json.loads(r.hgetall(key).get("payload") or "{}")
+    return True
+
+
+def legacy_shorten(r, token: str, seconds: int = 30):
+    key = cl._key_token(token)
+    if not r.exists(key):
+        return
+    r.expire(key, seconds)
+    r.hset(key, "expires_at", str(cl._now() + seconds))
+    h = r.hgetall(key)
+    pl = json.loads(h.get("payload") or "{}") if h else {}
+    if pl.get("page") == "connect" and pl.get("instance"):
+        r.expire(cl._key_connect_active(pl["instance"]), seconds)
+
+
+# --- medição -------------------------------------------------------------------
+
+def _measure(counter, op: Callable[[int], None], iterations: int):
+    samples: List[float] = []
+    before = counter["n"]
+    for i in range(iterations):
+        started = time.perf_counter()
+        op(i)
+        samples.append(time.perf_counter() - started)
+    stats = summarize(samples)
+    stats["rt_per_op"] = (counter["n"] - before) / iterations
+    return stats
+
+
+def run(iterations: int, fake: bool, rtt_ms: float, output: str):
+    r = make_redis(fake)
+    counter = count_round_trips(r, rtt_ms)
+    cl.r = r
+    cl._token_cache.max_size = 0  # mede o Redis, não o cache local
+
+    prefix = f"bench:{secrets.token_hex(4)}"
+    ttl = 600
+    results = []
+
+    def case(name, legacy, scripted):
+        results.append((name, _measure(counter, legacy, iterations), _measure(counter, scripted, iterations)))
+
+    # get-or-create: criação (instância nova) e reaproveitamento (já ativa)
+    case("get_or_create (novo)",
+         lambda i: legacy_get_or_create(r, f"{prefix}:a{i}", "k", ttl),
+         lambda i: cl.get_or_create_connect_link(f"{prefix}:b{i}", "k", ttl))
+    case("get_or_create (ativo)",
+         lambda i: legacy_get_or_create(r, f"{prefix}:a{i}", "k", ttl),
+         lambda i: cl.get_or_create_connect_link(f"{prefix}:b{i}", "k", ttl))
+
+    # Cada implementação opera sobre tokens no próprio formato (v1 com payload JSON / v2)
+    legacy_tokens = [legacy_get_or_create(r, f"{prefix}:d{i}", "k", ttl) for i in range(iterations)]
+    tokens = [cl.get_or_create_connect_link(f"{prefix}:c{i}", "k", ttl)[0] for i in range(iterations)]
+    case("validate",
+         lambda i: legacy_validate(r, legacy_tokens[i]),
+         lambda i: cl.validate_token(tokens[i]))
+    case("shorten",
+         lambda i: legacy_shorten(r, legacy_tokens[i], 60),
+         lambda i: cl.shorten_after_connected(tokens[i], 60))
+
+    lines = [
+        f"iterações={iterations} redis={'fakeredis' if fake else BENCH_REDIS_URL} rtt_simulado={rtt_ms}ms",
+        f"{'operação':<24}{'impl':<8}{'idas/op':>8}{'média µs':>11}{'p50 µs':>10}{'p99 µs':>10}",
+    ]
+    for name, legacy, scripted in results:
+        for label, st in (("antes", legacy), ("lua", scripted)):
+            lines.append(f"{name:<24}{label:<8}{st['rt_per_op']:>8.1f}{st['mean_us']:>11.1f}{st['p50_us']:>10.1f}{st['p99_us']:>10.1f}")
+    write_report("token_scripts", lines, output)
+
+    # Remove as chaves criadas pelo benchmark (tokens via índice por instância)
+    for key in r.scan_iter(match=f"instance_tokens:{prefix}:*", count=1000):
+        for tok in r.smembers(key):
+            r.delete(cl._key_token(tok))
+    for key in r.scan_iter(match=f"*{prefix}:*", count=1000):
+        r.delete(key)
+    stale = [inst for inst in r.sscan_iter(cl.KEY_LINK_INSTANCES, match=f"{prefix}:*")]
+    if stale:
+        r.srem(cl.KEY_LINK_INSTANCES, *stale)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", "--iterations", type=int, default=2000)
+    ap.add_argument("--fake", action="store_true", help="usa fakeredis em memória")
+    ap.add_argument("--rtt-ms", type=float, default=0.0, help="latência de rede simulada por ida ao Redis")
+    ap.add_argument("--output", default=DEFAULT_OUTPUT, help="arquivo onde o resultado é acrescentado ('' = não grava)")
+    args = ap.parse_args()
+    run(args.iterations, args.fake, args.rtt_ms, args.output)
+
+
+if __name__ == "__main__":
+    main()
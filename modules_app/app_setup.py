@@ -1,8 +1,14 @@
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from .config import STATIC_DIR
+from modules_scan import metrics
+
+from .assets import ASSETS_PREFIX, BUILD_DIR, ImmutableStaticFiles, asset_srcset, asset_url, load_manifest
+from .config import STATIC_DIR, templates
 
 def create_app() -> FastAPI:
     app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
@@ -15,10 +21,36 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # HTML/JSON comprimidos (imagens e text/event-stream ficam de fora)
+    app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
+
+    # Latência por rota (template da rota, não a URL, para não explodir a cardinalidade)
+    @app.middleware("http")
+    async def record_request_latency(request: Request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            metrics.HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                route=getattr(route, "path", "unmatched"),
+                method=request.method,
+                status=str(status),
+            )
+
     # Garante que /static/img exista (evita RuntimeError ao montar)
     (STATIC_DIR / "img").mkdir(parents=True, exist_ok=True)
 
     # Monta arquivos estáticos
     app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
+    # Versões otimizadas (hash no nome, WebP/AVIF, .br/.gz) com cache imutável
+    load_manifest()
+    app.mount(ASSETS_PREFIX, ImmutableStaticFiles(directory=str(BUILD_DIR), check_dir=False), name="assets")
+    templates.env.globals.update(asset_url=asset_url, asset_srcset=asset_srcset)
+
     return app
@@ -0,0 +1,246 @@
+"""
+Pipeline dos arquivos estáticos (static/ -> static/build/):
+
+  - cópia de cada arquivo com hash do conteúdo no nome (img/background.3fa2c1d4.jpg)
+  - imagens grandes: variantes WebP/AVIF redimensionadas (img/background-480.3fa2c1d4.webp)
+  - textos (css/js/svg/...): cópias pré-comprimidas .gz e .br ao lado do arquivo
+  - manifest.json: nome lógico -> arquivos gerados
+
+Roda no build da imagem (python -m modules_app.assets) e, se preciso, no
+startup do app: com o manifest em dia (hashes batem com static/) o startup só
+o lê, sem abrir imagens nem carregar o Pillow. Os arquivos de
+build/ são servidos em /assets com cache imutável (ImmutableStaticFiles).
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles
+
+from .config import STATIC_DIR
+
+BUILD_DIR = STATIC_DIR / "build"
+MANIFEST = BUILD_DIR / "manifest.json"
+ASSETS_PREFIX = "/assets"
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+TEXT_EXTS = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map", ".webmanifest"}
+VARIANT_WIDTHS = tuple(int(w) for w in os.getenv("ASSET_WIDTHS", "480,960,1440").split(","))
+VARIANT_MIN_BYTES = 32 * 1024   # imagens menores (ex.: favicon) ficam só com o hash
+VARIANT_QUALITY = {"webp": 78, "avif": 55}
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+
+_manifest: Optional[Dict[str, Any]] = None
+
+
+def _hashed_name(rel: Path, digest: str, suffix: str = "", ext: Optional[str] = None) -> Path:
+    return rel.with_name(f"{rel.stem}{suffix}.{digest}{ext or rel.suffix}")
+
+
+def _variant_formats():
+    from PIL import features
+
+    return [fmt for fmt in ("avif", "webp") if features.check(fmt)]
+
+
+def _build_image_variants(src: Path, rel: Path, digest: str) -> Dict[str, list]:
+    from PIL import Image
+
+    variants: Dict[str, list] = {}
+    with Image.open(src) as img:
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        widths = sorted({w for w in VARIANT_WIDTHS if w < img.width} | {min(img.width, max(VARIANT_WIDTHS))})
+        for fmt in _variant_formats():
+            for w in widths:
+                out_rel = _hashed_name(rel, digest, f"-{w}", f".{fmt}")
+                out = BUILD_DIR / out_rel
+                if not out.exists():
+                    h = round(img.height * w / img.width)
+                    resized = img if w == img.width else img.resize((w, h), Image.LANCZOS)
+                    resized.save(out, format=fmt.upper(), quality=VARIANT_QUALITY[fmt])
+                variants.setdefault(fmt, []).append([w, out_rel.as_posix()])
+    return variants
+
+
+def _build_precompressed(out: Path):
+    data = out.read_bytes()
+    gz = out.with_name(out.name + ".gz")
+    if not gz.exists():
+        gz.write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return ["gzip"]
+    br = out.with_name(out.name + ".br")
+    if not br.exists():
+        br.write_bytes(brotli.compress(data, quality=11))
+    return ["br", "gzip"]
+
+
+def _sources():
+    return [src for src in sorted(STATIC_DIR.rglob("*")) if src.is_file() and BUILD_DIR not in src.parents]
+
+
+def _manifest_is_current(manifest: Dict[str, Any]) -> bool:
+    """
+    True se o manifest cobre exatamente os arquivos atuais de static/ (pelo hash
+    no nome gerado) e os arquivos gerados existem.
+    """
+    sources = _sources()
+    if len(sources) != len(manifest):
+        return False
+    for src in sources:
+        rel = src.relative_to(STATIC_DIR)
+        entry = manifest.get(rel.as_posix())
+        if not entry:
+            return False
+        digest = hashlib.sha256(src.read_bytes()).hexdigest()[:8]
+        if entry.get("file") != _hashed_name(rel, digest).as_posix() or not (BUILD_DIR / entry["file"]).exists():
+            return False
+    return True
+
+
+def build_assets() -> Dict[str, Any]:
+    """
+    Gera build/ e o manifest a partir de static/ (idempotente).
+    """
+    manifest: Dict[str, Any] = {}
+    for src in _sources():
+        rel = src.relative_to(STATIC_DIR)
+        data = src.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:8]
+        out_rel = _hashed_name(rel, digest)
+        out = BUILD_DIR / out_rel
+        out.parent.mkdir(parents=True, exist_ok=True)
+        if not out.exists():
+            shutil.copyfile(src, out)
+
+        entry: Dict[str, Any] = {"file": out_rel.as_posix()}
+        ext = src.suffix.lower()
+        if ext in IMAGE_EXTS and len(data) >= VARIANT_MIN_BYTES:
+            entry["variants"] = _build_image_variants(src, rel, digest)
+        elif ext in TEXT_EXTS:
+            entry["encodings"] = _build_precompressed(out)
+        manifest[rel.as_posix()] = entry
+
+    tmp = MANIFEST.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    tmp.replace(MANIFEST)
+    return manifest
+
+
+def load_manifest() -> Dict[str, Any]:
+    """
+    Gera/atualiza build/ e carrega o manifest. Sem permissão de escrita (ex.:
+    build feito na imagem Docker), usa o manifest existente; sem ele ou sem
+    Pillow, segue vazio e os templates caem nos arquivos originais de /static.
+    """
+    global _manifest
+    try:
+        current = json.loads(MANIFEST.read_text(encoding="utf-8"))
+        if _manifest_is_current(current):
+            _manifest = current
+            return _manifest
+    except (OSError, ValueError):
+        pass
+    try:
+        _manifest = build_assets()
+    except Exception as e:
+        try:
+            _manifest = json.loads(MANIFEST.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            print(f"[WARN] Assets: usando arquivos originais de /static ({e})")
+            _manifest = {}
+    return _manifest
+
+
+def asset_url(name: str) -> str:
+    """
+    URL (com hash) de um arquivo de static/, ex.: asset_url("img/favicon.png").
+    """
+    entry = (_manifest or {}).get(name.lstrip("/"))
+    if not entry:
+        return f"/static/{name.lstrip('/')}"
+    return f"{ASSETS_PREFIX}/{entry['file']}"
+
+
+def asset_srcset(name: str, fmt: str) -> str:
+    """
+    srcset com as variantes redimensionadas no formato dado ("" se não houver).
+    """
+    entry = (_manifest or {}).get(name.lstrip("/")) or {}
+    variants = (entry.get("variants") or {}).get(fmt) or []
+    return ", ".join(f"{ASSETS_PREFIX}/{path} {w}w" for w, path in variants)
+
+
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))  # em ordem de preferência
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """
+    Accept-Encoding -> {codificação: q}. "br;q=0" recusa br; "*" vale para as não citadas.
+    """
+    out: Dict[str, float] = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        out[token] = q
+    return out
+
+
+def _pick_encoding(header: str):
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding, ext in PRECOMPRESSED:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = (encoding, ext), q
+    return best
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Serve build/ com cache imutável e, quando o cliente aceita (q > 0), a cópia
+    pré-comprimida (.br/.gz) do arquivo.
+    """
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        choice = _pick_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if choice is not None:
+            encoding, ext = choice
+            compressed = Path(str(full_path) + ext)
+            if compressed.is_file():
+                media_type = mimetypes.guess_type(str(full_path))[0] or "application/octet-stream"
+                resp = FileResponse(compressed, media_type=media_type, stat_result=os.stat(compressed))
+                resp.headers["Content-Encoding"] = encoding
+                resp.headers["Vary"] = "Accept-Encoding"
+                resp.headers["Cache-Control"] = CACHE_IMMUTABLE
+                return resp
+        resp = super().file_response(full_path, stat_result, scope, status_code)
+        resp.headers["Vary"] = "Accept-Encoding"
+        resp.headers["Cache-Control"] = CACHE_IMMUTABLE
+        return resp
+
+
+if __name__ == "__main__":
+    built = build_assets()
+    print(f"[OK] {len(built)} arquivo(s) em {BUILD_DIR}")
@@ -1,17 +1,38 @@
 import os
 from pathlib import Path
 
-from dotenv import load_dotenv
 from fastapi.templating import Jinja2Templates
-import requests
 
 # =========================
 # Config / Boot
 # =========================
-load_dotenv()
+# O .env é carregado uma única vez, pela config do scanner (compartilhada)
+from modules_scan import config as scan_config  # noqa: F401
 
 DOMAIN = os.getenv("EVOLUTION_DOMAIN") or ""
-requests.packages.urllib3.disable_warnings()  # noqa
+
+# Se definido, /metrics exige "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or ""
+
+# Cache compartilhado de /api/qr-status (ms): TTL do status e validade do lock single-flight
+QR_STATUS_CACHE_TTL_MS = int(os.getenv("QR_STATUS_CACHE_TTL_MS", "3000"))
+QR_STATUS_LOCK_MS = int(os.getenv("QR_STATUS_LOCK_MS", "12000"))
+
+# Stream (SSE) de /api/qr-stream: intervalo do watcher por instância e heartbeat
+QR_STREAM_POLL_MS = int(os.getenv("QR_STREAM_POLL_MS", "2000"))
+QR_STREAM_HEARTBEAT_S = float(os.getenv("QR_STREAM_HEARTBEAT_S", "15"))
+QR_STREAM_REVALIDATE_S = float(os.getenv("QR_STREAM_REVALIDATE_S", "60"))
+
+# Cache das imagens de QR (/api/qr-png): orçamento em bytes por processo e TTL (s) no Redis
+QR_IMAGE_CACHE_BYTES = int(os.getenv("QR_IMAGE_CACHE_BYTES", str(4 * 1024 * 1024)))
+QR_IMAGE_CACHE_TTL = int(os.getenv("QR_IMAGE_CACHE_TTL", "300"))
+
+# Cache das fotos de perfil (/api/profile-photo): nº máx. de fotos, TTL no Redis (s),
+# janela sem revalidar no CDN (s) e tamanho máx. (bytes) de uma foto cacheável
+PROFILE_PHOTO_CACHE_MAX = int(os.getenv("PROFILE_PHOTO_CACHE_MAX", "2000"))
+PROFILE_PHOTO_CACHE_TTL = int(os.getenv("PROFILE_PHOTO_CACHE_TTL", str(24 * 60 * 60)))
+PROFILE_PHOTO_FRESH_S = int(os.getenv("PROFILE_PHOTO_FRESH_S", "600"))
+PROFILE_PHOTO_MAX_BYTES = int(os.getenv("PROFILE_PHOTO_MAX_BYTES", str(1024 * 1024)))
 
 # Paths base (BASE_DIR = raiz do projeto; este arquivo está em /modulo)
 BASE_DIR = Path(__file__).resolve().parent.parent
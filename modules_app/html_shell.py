@@ -0,0 +1,64 @@
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse
+from markupsafe import escape
+
+from .config import templates
+
+# As páginas só variam pelo token e pela URL da requisição (canonical/og:url).
+# Cada template é renderizado uma vez por base URL com marcadores no lugar
+# desses valores; por requisição só se intercalam os pedaços com os valores.
+
+_SLOT_TOKEN = "__SHELL_TOKEN__"
+_SLOT_URL = "__SHELL_URL__"
+_MAX_SHELLS = 32  # base URL vem do Host: limita a memória
+
+_shells: Dict[Tuple[str, str], List[Tuple[str, Optional[str]]]] = {}
+
+NO_STORE_HEADERS = {
+    "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+    "Pragma": "no-cache",
+    "Expires": "0",
+}
+
+
+class _ShellRequest:
+    """
+    Substituto de Request nos templates: base_url real, url como marcador.
+    """
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.url = _SLOT_URL
+
+
+def _compile(name: str, request: Request) -> List[Tuple[str, Optional[str]]]:
+    html = templates.get_template(name).render(request=_ShellRequest(request.base_url), token=_SLOT_TOKEN)
+    parts: List[Tuple[str, Optional[str]]] = []
+    pos = 0
+    while True:
+        hits = [(html.find(slot, pos), slot) for slot in (_SLOT_TOKEN, _SLOT_URL)]
+        hits = [(i, slot) for i, slot in hits if i >= 0]
+        if not hits:
+            parts.append((html[pos:], None))
+            return parts
+        i, slot = min(hits)
+        parts.append((html[pos:i], slot))
+        pos = i + len(slot)
+
+
+def render_page(request: Request, name: str, token: str = "", status_code: int = 200) -> HTMLResponse:
+    """
+    Equivalente a templates.TemplateResponse(request, name, {"request", "token"}),
+    a partir do shell pré-renderizado.
+    """
+    key = (name, str(request.base_url))
+    parts = _shells.get(key)
+    if parts is None:
+        if len(_shells) >= _MAX_SHELLS:
+            _shells.clear()
+        parts = _shells[key] = _compile(name, request)
+
+    values = {_SLOT_TOKEN: str(escape(token)), _SLOT_URL: str(escape(str(request.url)))}
+    body = "".join(text + (values[slot] if slot else "") for text, slot in parts)
+    return HTMLResponse(body, status_code=status_code, headers=NO_STORE_HEADERS)
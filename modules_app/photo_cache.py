@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import time
+from email.utils import formatdate
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+import redis
+from starlette.concurrency import run_in_threadpool
+
+from modules_scan import http_client
+from modules_scan.core_links import get_async_redis
+
+from .config import (
+    PROFILE_PHOTO_CACHE_MAX, PROFILE_PHOTO_CACHE_TTL, PROFILE_PHOTO_FRESH_S, PROFILE_PHOTO_MAX_BYTES,
+)
+
+# Cache das fotos de perfil (CDN do WhatsApp), por profilePicUrl:
+#   profile_photo:{hash}   HASH  body (base64), content_type, etag, last_modified,
+#                                fetched_at e variantes redimensionadas (body_{px})
+#   profile_photo:lru      ZSET  hash -> último acesso (limita a PROFILE_PHOTO_CACHE_MAX fotos)
+# Dentro de PROFILE_PHOTO_FRESH_S a foto é servida direto do cache; depois disso
+# é revalidada no CDN com If-None-Match/If-Modified-Since (304 só renova).
+# Se o CDN falhar, a cópia antiga continua sendo servida.
+
+KEY_LRU = "profile_photo:lru"
+
+RESIZE_MIN, RESIZE_MAX = 16, 512
+
+
+def _key_photo(digest: str) -> str:
+    return f"profile_photo:{digest}"
+
+
+def _resize(body: bytes, px: int) -> bytes:
+    from PIL import Image
+
+    with Image.open(BytesIO(body)) as img:
+        img = img.convert("RGB")
+        # Corta no centro (a página exibe quadrado com object-cover) e reduz
+        side = min(img.size)
+        left, top = (img.width - side) // 2, (img.height - side) // 2
+        img = img.crop((left, top, left + side, top + side))
+        if side > px:
+            img = img.resize((px, px), Image.LANCZOS)
+        out = BytesIO()
+        img.save(out, format="JPEG", quality=85, optimize=True)
+        return out.getvalue()
+
+
+async def _fetch(url: str, cached: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """
+    GET (condicional, se houver cópia) no CDN. Retorna os campos a gravar,
+    {} quando o CDN respondeu 304, ou None em falha.
+    """
+    headers = {}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    try:
+        r = await http_client.aget("profile_photo", url, headers=headers)
+    except Exception:
+        return None
+    if r.status_code == 304 and cached.get("body"):
+        return {}
+    if r.is_error or not r.content:
+        return None
+    return {
+        "body": base64.b64encode(r.content).decode("ascii"),
+        "content_type": r.headers.get("Content-Type", "image/jpeg"),
+        "etag": r.headers.get("ETag", ""),
+        "last_modified": r.headers.get("Last-Modified", ""),
+        "size": str(len(r.content)),
+    }
+
+
+async def get_photo(url: str, px: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Retorna {"body", "content_type", "etag", "last_modified"} da foto
+    (redimensionada para px x px, se informado) ou None se indisponível.
+    """
+    if px is not None:
+        px = max(RESIZE_MIN, min(RESIZE_MAX, int(px)))
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    key = _key_photo(digest)
+    ar = get_async_redis()
+    now = time.time()
+
+    try:
+        cached = await ar.hgetall(key) or {}
+    except redis.RedisError:
+        cached = {}
+
+    fresh = bool(cached.get("body")) and now - float(cached.get("fetched_at") or 0) < PROFILE_PHOTO_FRESH_S
+    updates: Dict[str, str] = {}
+    if not fresh:
+        fetched = await _fetch(url, cached)
+        if fetched is None and not cached.get("body"):
+            return None
+        if fetched:
+            cached = fetched  # conteúdo novo: descarta variantes antigas
+            updates.update(fetched)
+        if fetched is not None:
+            updates["fetched_at"] = str(now)
+
+    body = original = base64.b64decode(cached["body"])
+    content_type = cached.get("content_type") or "image/jpeg"
+    if px is not None:
+        variant = cached.get(f"body_{px}")
+        if variant:
+            body = base64.b64decode(variant)
+        else:
+            try:
+                body = await run_in_threadpool(_resize, body, px)
+                updates[f"body_{px}"] = base64.b64encode(body).decode("ascii")
+            except Exception:
+                px = None  # formato não suportado pelo Pillow: serve o original
+        if px is not None:
+            content_type = "image/jpeg"
+
+    if len(original) <= PROFILE_PHOTO_MAX_BYTES:
+        try:
+            async with ar.pipeline(transaction=False) as p:
+                if "body" in updates:
+                    p.delete(key)
+                if updates:
+                    p.hset(key, mapping=updates)
+                p.expire(key, PROFILE_PHOTO_CACHE_TTL)
+                p.zadd(KEY_LRU, {digest: now})
+                p.zcard(KEY_LRU)
+                *_, total = await p.execute()
+            if total > PROFILE_PHOTO_CACHE_MAX:
+                evicted = await ar.zpopmin(KEY_LRU, total - PROFILE_PHOTO_CACHE_MAX)
+                if evicted:
+                    await ar.delete(*[_key_photo(d) for d, _ in evicted])
+        except redis.RedisError:
+            pass
+
+    fetched_at = float(updates.get("fetched_at") or cached.get("fetched_at") or now)
+    return {
+        "body": body,
+        "content_type": content_type,
+        # Validadores do que é servido (bytes possivelmente redimensionados)
+        "etag": f'"{hashlib.sha1(body).hexdigest()}"',
+        "last_modified": cached.get("last_modified") or formatdate(fetched_at, usegmt=True),
+    }
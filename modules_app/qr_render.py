@@ -0,0 +1,108 @@
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Optional, Tuple
+
+import redis
+from starlette.concurrency import run_in_threadpool
+
+from modules_scan.core_links import get_async_redis
+
+from .config import QR_IMAGE_CACHE_BYTES, QR_IMAGE_CACHE_TTL
+
+# Imagens de QR renderizadas, por hash do conteúdo + formato:
+#   - LRU em memória limitado por bytes (QR_IMAGE_CACHE_BYTES)
+#   - Redis qr_img:{formato}:{hash} (TTL QR_IMAGE_CACHE_TTL), compartilhado entre workers
+# O mesmo texto de QR é renderizado uma vez, independente de quantas abas pedem.
+
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def content_hash(txt: str) -> str:
+    return hashlib.sha1(txt.encode("utf-8")).hexdigest()
+
+
+def _key_image(fmt: str, digest: str) -> str:
+    return f"qr_img:{fmt}:{digest}"
+
+
+class _ByteLRU:
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.size = 0
+        self._items: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: Tuple[str, str], data: bytes):
+        if len(data) > self.budget:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.budget:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+_cache = _ByteLRU(QR_IMAGE_CACHE_BYTES)
+
+
+def _render(txt: str, fmt: str) -> bytes:
+    # qrcode/Pillow só são carregados na primeira renderização (fora do startup)
+    import qrcode
+    import qrcode.image.svg
+
+    if fmt == "svg":
+        # Só monta o XML do caminho: não passa pelo Pillow
+        return qrcode.make(txt, image_factory=qrcode.image.svg.SvgPathImage).to_string()
+    buf = BytesIO()
+    qrcode.make(txt).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _encode(data: bytes, fmt: str) -> str:
+    return data.decode("utf-8") if fmt == "svg" else base64.b64encode(data).decode("ascii")
+
+
+def _decode(raw: str, fmt: str) -> bytes:
+    return raw.encode("utf-8") if fmt == "svg" else base64.b64decode(raw)
+
+
+async def get_qr_image(txt: str, fmt: str = "png") -> Tuple[bytes, str]:
+    """
+    Retorna (bytes, hash) da imagem do QR no formato pedido ("png" ou "svg").
+    """
+    digest = content_hash(txt)
+    key = (fmt, digest)
+    data = _cache.get(key)
+    if data is not None:
+        return data, digest
+
+    ar = get_async_redis()
+    try:
+        raw = await ar.get(_key_image(fmt, digest))
+    except redis.RedisError:
+        raw = None
+    if raw:
+        data = _decode(raw, fmt)
+    else:
+        # Renderização é CPU: fora do event loop
+        data = await run_in_threadpool(_render, txt, fmt)
+        try:
+            await ar.set(_key_image(fmt, digest), _encode(data, fmt), ex=QR_IMAGE_CACHE_TTL)
+        except redis.RedisError:
+            pass
+    _cache.put(key, data)
+    return data, digest
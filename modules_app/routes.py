@@ -1,74 +1,145 @@
+import asyncio
 import base64
+import hashlib
+import hmac
+import time
 from io import BytesIO
 from typing import Dict, Any
 
-import qrcode
-import requests
-from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse
+from fastapi import APIRouter, Request, HTTPException, Body
+from fastapi.responses import HTMLResponse, StreamingResponse, Response
 
-from modules_scan.core_links import shorten_after_connected  # mantém dependência externa
+from modules_scan.core_links import ashorten_after_connected  # mantém dependência externa
+from modules_scan import breaker, metrics
+from modules_scan.config import WEBHOOK_SECRET
 
-from .config import templates, STATIC_DIR
+from .config import (
+    STATIC_DIR, METRICS_TOKEN, QR_STREAM_HEARTBEAT_S, QR_STREAM_REVALIDATE_S,
+    PROFILE_PHOTO_FRESH_S,
+)
 from .utils import json_no_store
+from .html_shell import render_page
 from .security import guard_and_get_payload
-from .services import fetch_qr_code_status, get_bot_profile
+from .services import get_qr_status, get_bot_profile, apply_webhook_event
+from .status_stream import sse_event, subscribe_watcher
+from .qr_render import get_qr_image, MEDIA_TYPES
+from .photo_cache import get_photo
 
 router = APIRouter()
 
 @router.get("/", response_class=HTMLResponse)
-def ui_connect(request: Request):
+async def ui_connect(request: Request):
     token = request.query_params.get("t")
     try:
-        _ = guard_and_get_payload(token)
+        _ = await guard_and_get_payload(token)
     except HTTPException as e:
-        resp = templates.TemplateResponse("invalid.html", {"request": request}, status_code=e.status_code)
-        resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-        resp.headers["Pragma"] = "no-cache"
-        resp.headers["Expires"] = "0"
-        return resp
-
-    resp = templates.TemplateResponse("connect.html", {"request": request, "token": token})
-    resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    resp.headers["Pragma"] = "no-cache"
-    resp.headers["Expires"] = "0"
-    return resp
+        return render_page(request, "invalid.html", status_code=e.status_code)
+
+    return render_page(request, "connect.html", token=token)
 
 @router.get("/api/qr-status")
-def api_qr_status(request: Request):
+async def api_qr_status(request: Request):
     token = request.query_params.get("t")
     try:
-        payload = guard_and_get_payload(token)
+        payload = await guard_and_get_payload(token)
     except HTTPException:
         return json_no_store({"status": "invalid", "message": "Link inválido ou expirado"}, status_code=200)
 
     instance = payload["instance"]
     apikey = payload["apikey"]
 
-    data = fetch_qr_code_status(instance, apikey)
+    data = await get_qr_status(instance, apikey)
     if data.get("status") == "connected":
         try:
-            shorten_after_connected(token)
+            await ashorten_after_connected(token)
         except Exception:
             pass
     return json_no_store(data)
 
+@router.get("/api/qr-stream")
+async def api_qr_stream(request: Request):
+    """
+    Server-Sent Events: envia o status (mesmo JSON de /api/qr-status) somente
+    quando status/QR mudam. Um watcher por instância atende todas as abas.
+    """
+    token = request.query_params.get("t")
+    try:
+        payload = await guard_and_get_payload(token)
+    except HTTPException:
+        # Responde como stream (o EventSource não lê JSON): um evento "invalid" e fim;
+        # a página mostra o link inválido e fecha a conexão em vez de reconectar
+        async def invalid():
+            yield sse_event({"status": "invalid", "message": "Link inválido ou expirado"})
+        return _event_stream(invalid())
+
+    instance = payload["instance"]
+    apikey = payload["apikey"]
+
+    async def events():
+        watcher, q = subscribe_watcher(instance, lambda: get_qr_status(instance, apikey))
+        revalidate_at = time.monotonic() + QR_STREAM_REVALIDATE_S
+        shortened = False
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    data = await asyncio.wait_for(q.get(), timeout=QR_STREAM_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                else:
+                    if data.get("status") == "connected" and not shortened:
+                        shortened = True
+                        try:
+                            await ashorten_after_connected(token)
+                        except Exception:
+                            pass
+                    yield sse_event(data)
+
+                # Link expirado/encurtado: encerra o stream como a rota de polling faria
+                if not shortened and time.monotonic() >= revalidate_at:
+                    revalidate_at = time.monotonic() + QR_STREAM_REVALIDATE_S
+                    try:
+                        await guard_and_get_payload(token)
+                    except HTTPException:
+                        yield sse_event({"status": "invalid", "message": "Link inválido ou expirado"})
+                        return
+        finally:
+            watcher.unsubscribe(q)
+
+    return _event_stream(events())
+
+def _event_stream(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",  # desativa buffer em proxies (nginx)
+        },
+    )
+
 @router.get("/api/qr-png")
-def api_qr_png(request: Request):
+async def api_qr_png(request: Request):
     """
-    Fallback: gera um PNG do QR no servidor a partir do código textual
-    ou traduz uma dataURL/base64 em PNG binário.
+    Fallback: gera um PNG (ou SVG, com ?format=svg) do QR no servidor a partir
+    do código textual ou traduz uma dataURL/base64 em PNG binário.
     """
+    fmt = (request.query_params.get("format") or "png").lower()
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Formato inválido")
+
     token = request.query_params.get("t")
     try:
-        payload = guard_and_get_payload(token)
+        payload = await guard_and_get_payload(token)
     except HTTPException as e:
         raise HTTPException(status_code=404, detail=str(e.detail))
 
     instance = payload["instance"]
     apikey = payload["apikey"]
 
-    data = fetch_qr_code_status(instance, apikey)
+    data = await get_qr_status(instance, apikey)
     if data.get("status") != "qr_code":
         raise HTTPException(status_code=404, detail="QR indisponível")
 
@@ -92,22 +163,22 @@ def api_qr_png(request: Request):
     if not txt:
         raise HTTPException(status_code=404, detail="Código de QR vazio")
 
-    qr_img = qrcode.make(txt)
-    buf = BytesIO()
-    qr_img.save(buf, format="PNG")
-    buf.seek(0)
-    return StreamingResponse(buf, media_type="image/png", headers={"Cache-Control": "no-store"})
+    data, digest = await get_qr_image(txt, fmt)
+    etag = f'"{fmt}-{digest}"'
+    headers = {"Cache-Control": "private, no-cache", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(data, media_type=MEDIA_TYPES[fmt], headers=headers)
 
 @router.get("/api/profile")
-def api_profile(request: Request):
+async def api_profile(request: Request):
     token = request.query_params.get("t")
     try:
-        payload = guard_and_get_payload(token)
+        payload = await guard_and_get_payload(token)
     except HTTPException as e:
         return json_no_store({"ok": False, "message": str(e.detail)}, status_code=200)
 
-    apikey = payload["apikey"]
-    info = get_bot_profile(apikey)
+    info = await get_bot_profile(payload["apikey"], payload["instance"])
     if not info.get("ok"):
         return json_no_store({"ok": False, "message": info.get("message", "Falha ao obter perfil")}, status_code=200)
 
@@ -126,15 +197,14 @@ def api_profile(request: Request):
     )
 
 @router.get("/api/profile-photo")
-def api_profile_photo(request: Request):
+async def api_profile_photo(request: Request):
     token = request.query_params.get("t")
     try:
-        payload = guard_and_get_payload(token)
+        payload = await guard_and_get_payload(token)
     except HTTPException as e:
         raise HTTPException(status_code=404, detail=str(e.detail))
 
-    apikey = payload["apikey"]
-    info = get_bot_profile(apikey)
+    info = await get_bot_profile(payload["apikey"], payload["instance"])
     if not info.get("ok"):
         raise HTTPException(status_code=404, detail="Perfil indisponível")
 
@@ -143,14 +213,63 @@ def api_profile_photo(request: Request):
     if not img_url:
         raise HTTPException(status_code=404, detail="Sem imagem de perfil")
 
-    try:
-        r = requests.get(img_url, stream=True, timeout=10, verify=False)
-        r.raise_for_status()
-        content_type = r.headers.get("Content-Type", "image/jpeg")
-        return StreamingResponse(r.raw, media_type=content_type, headers={"Cache-Control": "no-store"})
-    except Exception:
+    size = request.query_params.get("size")
+    px = int(size) if size and size.isdigit() else None
+    photo = await get_photo(img_url, px)
+    if photo is None:
         raise HTTPException(status_code=502, detail="Falha ao carregar a imagem")
 
+    headers = {
+        "Cache-Control": f"private, max-age={PROFILE_PHOTO_FRESH_S}",
+        "ETag": photo["etag"],
+        "Last-Modified": photo["last_modified"],
+    }
+    if request.headers.get("if-none-match") == photo["etag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(photo["body"], media_type=photo["content_type"], headers=headers)
+
+@router.post("/webhook/evolution", include_in_schema=False)
+@router.post("/webhook/evolution/{event}", include_in_schema=False)
+async def webhook_evolution(request: Request, body: Dict[str, Any] = Body(default=None), event: str = ""):
+    """
+    Recebe eventos da Evolution (connection.update, qrcode.updated).
+    Autenticação: header "x-webhook-secret" igual a WEBHOOK_SECRET (só header:
+    segredo na query string acabaria nos logs de acesso e de proxies).
+    Com "webhook by events", a Evolution acrescenta o nome do evento ao path.
+    """
+    if not WEBHOOK_SECRET:
+        raise HTTPException(status_code=404)
+    secret = request.headers.get("x-webhook-secret") or ""
+    if not hmac.compare_digest(secret.encode(), WEBHOOK_SECRET.encode()):
+        raise HTTPException(status_code=401, detail="Não autorizado")
+
+    if isinstance(body, dict) and event and not body.get("event"):
+        body = {**body, "event": event}
+    instance = await apply_webhook_event(body)
+    return json_no_store({"ok": True, "instance": instance})
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=404)
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@router.get("/status/upstream", include_in_schema=False)
+async def upstream_status(request: Request):
+    # Estado dos circuit breakers da Evolution neste worker (mesma proteção do /metrics)
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=404)
+    return json_no_store(breaker.status())
+
+_favicon: Dict[str, Any] = {}
+
 @router.get("/favicon.ico", include_in_schema=False)
-def favicon():
-    return FileResponse(str(STATIC_DIR / "img" / "favicon.png"), media_type="image/png")
+async def favicon(request: Request):
+    # Lido do disco uma vez por processo; o navegador revalida com ETag
+    if not _favicon:
+        body = (STATIC_DIR / "img" / "favicon.png").read_bytes()
+        _favicon.update(body=body, etag=f'"{hashlib.sha1(body).hexdigest()[:16]}"')
+    headers = {"Cache-Control": "public, max-age=86400", "ETag": _favicon["etag"]}
+    if request.headers.get("if-none-match") == _favicon["etag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(_favicon["body"], media_type="image/png", headers=headers)
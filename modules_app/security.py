@@ -1,12 +1,12 @@
 from typing import Dict, Any, Optional
 from fastapi import HTTPException
-from modules_scan.core_links import validate_token  # mantém dependência externa
+from modules_scan.core_links import avalidate_token  # mantém dependência externa
 
-def guard_and_get_payload(token: Optional[str]) -> Dict[str, Any]:
+async def guard_and_get_payload(token: Optional[str]) -> Dict[str, Any]:
     if not token:
         raise HTTPException(status_code=404, detail="Link inválido ou expirado")
 
-    ok, msg, payload = validate_token(token)
+    ok, msg, payload = await avalidate_token(token)
     if not ok or not payload or payload.get("page") != "connect":
         raise HTTPException(status_code=404, detail=(msg if isinstance(msg, str) else "Link inválido ou expirado"))
 
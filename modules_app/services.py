@@ -1,15 +1,19 @@
-import requests
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from modules_scan import http_client  # cliente HTTP compartilhado (pool keep-alive)
+from modules_scan import instance_state, profiles
+
+from . import status_cache
 
 from .config import DOMAIN
 from .utils import _extract_qrcode
 
-def fetch_qr_code_status(instance_name: str, apikey: str) -> Dict[str, Any]:
+async def fetch_qr_code_status(instance_name: str, apikey: str) -> Dict[str, Any]:
     # Chama o endpoint do servidor WPP para pegar status e/ou QR. Aceita vários formatos.
     try:
         url = f"{DOMAIN}/instance/connect/{instance_name}"
         headers = {"apikey": apikey}
-        r = requests.get(url, headers=headers, verify=False, timeout=10)
+        r = await http_client.aget("connect", url, headers=headers)
         r.raise_for_status()
         data = r.json()
     except Exception:
@@ -32,24 +36,79 @@ def fetch_qr_code_status(instance_name: str, apikey: str) -> Dict[str, Any]:
 
     return {"qrcode": None, "qr_format": None, "status": "unknown", "raw": data}
 
-def get_bot_profile(apikey: str) -> Dict[str, Any]:
+async def get_qr_status(instance_name: str, apikey: str) -> Dict[str, Any]:
+    # Estado recente recebido por webhook, se houver; senão consulta o servidor (fallback)
+    # através do cache compartilhado com single-flight.
+    state = await instance_state.aget_state(instance_name)
+    if state is not None:
+        return state
+    return await status_cache.get_or_fetch(instance_name, lambda: fetch_qr_code_status(instance_name, apikey))
+
+async def apply_webhook_event(body: Dict[str, Any]) -> Optional[str]:
+    # Traduz connection.update / qrcode.updated para o estado da instância. Retorna a instância.
+    if not isinstance(body, dict):
+        return None
+    event = str(body.get("event") or "").lower().replace("_", ".").replace("-", ".")
+    data = body.get("data") if isinstance(body.get("data"), dict) else {}
+    instance = body.get("instance") or data.get("instance")
+    if isinstance(instance, dict):
+        instance = instance.get("instanceName") or instance.get("name")
+    if not instance or not isinstance(instance, str):
+        return None
+
+    if event == "qrcode.updated":
+        qr = data.get("qrcode") if isinstance(data.get("qrcode"), dict) else {}
+        if isinstance(qr.get("code"), str) and qr["code"].strip():
+            qr_info = {"value": qr["code"], "format": "text"}
+        else:
+            qr_info = _extract_qrcode({"code": qr} if qr else data)
+        if not qr_info["value"]:
+            return None
+        await instance_state.arecord_state(instance, "qr_code", qr_info["value"], qr_info["format"])
+        return instance
+
+    if event == "connection.update":
+        state = str(data.get("state") or "").lower()
+        # Fora de "open" não há o que guardar: apagar o estado faz o próximo poll
+        # consultar /instance/connect, que é o que gera o QR na Evolution
+        status = "connected" if state in ("open", "connected") else "unknown"
+        await instance_state.arecord_state(instance, status, state=state)
+        if status == "connected":
+            # Acabou de conectar: o perfil gravado (se houver) pode ser de outro aparelho
+            await profiles.ainvalidate(instance)
+        return instance
+
+    return None
+
+async def get_bot_profile(apikey: str, instance: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Perfil do WhatsApp da instância. Com `instance`, lê primeiro o registro
+    gravado pelo scanner (instance_profile:{instance}) e só consulta a
+    Evolution quando não há registro com nome/foto do WhatsApp.
+    """
+    if instance:
+        cached = await profiles.aget_profile(instance)
+        if cached:
+            return {"ok": True, "profile": cached}
+
     try:
         url = f"{DOMAIN}/instance/fetchInstances"
         headers = {"apikey": apikey}
-        r = requests.get(url, headers=headers, verify=False, timeout=10)
+        r = await http_client.aget("profile", url, headers=headers)
         r.raise_for_status()
         js = r.json()
         if isinstance(js, list) and js:
             p = js[0] or {}
-            return {
-                "ok": True,
-                "profile": {
-                    "profileName": p.get("profileName") or p.get("name"),
-                    "name": p.get("profileName") or p.get("name"),
-                    "number": p.get("number"),
-                    "profilePicUrl": p.get("profilePicUrl"),
-                },
+            profile = {
+                "profileName": p.get("profileName") or p.get("name"),
+                "name": p.get("profileName") or p.get("name"),
+                "number": p.get("number"),
+                "profilePicUrl": p.get("profilePicUrl"),
             }
+            # Só grava perfil de verdade (instância ainda não conectada volta sem nome/foto)
+            if instance and profiles.has_profile(instance, profile):
+                await profiles.astore_profile(instance, profile)
+            return {"ok": True, "profile": profile}
         return {"ok": False, "message": "Lista de perfis vazia."}
     except Exception:
         return {"ok": False, "message": "Não foi possível carregar o perfil do WhatsApp."}
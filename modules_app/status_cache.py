@@ -0,0 +1,81 @@
+import asyncio
+import json
+import uuid
+from typing import Any, Awaitable, Callable, Dict
+
+import redis
+
+from modules_scan.core_links import _script, get_async_redis
+
+from .config import QR_STATUS_CACHE_TTL_MS, QR_STATUS_LOCK_MS
+
+# Cache curto do status por instância, compartilhado entre workers via Redis,
+# com single-flight: N pollers simultâneos da mesma instância geram no máximo
+# 1 chamada ao upstream por intervalo (dentro do processo e entre processos).
+
+_POLL_INTERVAL = 0.05
+
+_inflight: Dict[str, "asyncio.Task"] = {}
+
+# Libera o lock só se ainda for nosso: um fetch mais lento que QR_STATUS_LOCK_MS
+# não pode apagar o lock que outro worker já pegou
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _key_cache(instance: str) -> str:
+    return f"qr_status_cache:{instance}"
+
+
+def _key_lock(instance: str) -> str:
+    return f"qr_status_lock:{instance}"
+
+
+async def _load_or_fetch(instance: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    ar = get_async_redis()
+    key, lock = _key_cache(instance), _key_lock(instance)
+
+    cached = await ar.get(key)
+    if cached:
+        return json.loads(cached)
+
+    deadline = asyncio.get_running_loop().time() + QR_STATUS_LOCK_MS / 1000.0
+    while True:
+        # Só quem pega o lock consulta o upstream; os demais aguardam o cache
+        owner = uuid.uuid4().hex
+        if await ar.set(lock, owner, px=QR_STATUS_LOCK_MS, nx=True):
+            try:
+                data = await fetch()
+                await ar.set(key, json.dumps(data, ensure_ascii=False), px=QR_STATUS_CACHE_TTL_MS)
+                return data
+            finally:
+                await _script(ar, _RELEASE_LUA)(keys=[lock], args=[owner])
+
+        await asyncio.sleep(_POLL_INTERVAL)
+        cached = await ar.get(key)
+        if cached:
+            return json.loads(cached)
+        if asyncio.get_running_loop().time() >= deadline:
+            # Dono do lock sumiu sem preencher o cache: consulta direto
+            return await fetch()
+
+
+async def get_or_fetch(instance: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Retorna o status em cache da instância ou executa `fetch` (uma vez) para preenchê-lo.
+    """
+    loop = asyncio.get_running_loop()
+    task = _inflight.get(instance)
+    if task is None or task.done() or task.get_loop() is not loop:
+        task = loop.create_task(_load_or_fetch(instance, fetch))
+        _inflight[instance] = task
+        task.add_done_callback(lambda t: _inflight.pop(instance, None) if _inflight.get(instance) is t else None)
+    try:
+        return await asyncio.shield(task)
+    except redis.RedisError:
+        # Redis fora do ar não pode derrubar a página: vai direto ao upstream
+        return await fetch()
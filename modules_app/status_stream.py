@@ -0,0 +1,94 @@
+import asyncio
+import json
+import time
+from typing import Any, Callable, Awaitable, Dict, Optional, Set, Tuple
+
+from .config import QR_STREAM_POLL_MS
+
+# Um "watcher" por instância (por processo) consulta o status e distribui para
+# todos os assinantes (abas abertas) apenas quando status/QR mudam.
+# O watcher encerra sozinho quando não há mais assinantes.
+# Um novo assinante recebe o último status na hora só se ele foi confirmado por
+# uma consulta recente; senão recebe o resultado da próxima consulta.
+
+_watchers: Dict[str, "InstanceWatcher"] = {}
+
+
+def _signature(data: Dict[str, Any]):
+    return (data.get("status"), data.get("qrcode"), data.get("qr_format"))
+
+
+class InstanceWatcher:
+    def __init__(self, instance: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]):
+        self.instance = instance
+        self.fetch = fetch
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.last: Optional[Dict[str, Any]] = None
+        self.fetched_at = 0.0  # time.monotonic() da última consulta concluída
+        self.task: Optional[asyncio.Task] = None
+        self._waiting: Set[asyncio.Queue] = set()  # aguardam a próxima consulta
+
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=8)
+        running = self.task is not None and not self.task.done()
+        if running and self.last is not None and time.monotonic() - self.fetched_at <= 2 * QR_STREAM_POLL_MS / 1000.0:
+            q.put_nowait(self.last)
+        else:
+            self._waiting.add(q)
+        self.subscribers.add(q)
+        if not running:
+            # Watcher parado (ou que acabou de encerrar): volta ao registro e reinicia
+            _watchers[self.instance] = self
+            self.task = asyncio.get_running_loop().create_task(self._run())
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        self.subscribers.discard(q)
+        self._waiting.discard(q)
+
+    def _publish(self, data: Dict[str, Any], queues=None):
+        for q in list(self.subscribers if queues is None else queues):
+            if q.full():
+                # Assinante lento: descarta o mais antigo, só o estado atual importa
+                try:
+                    q.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            q.put_nowait(data)
+
+    async def _run(self):
+        try:
+            while self.subscribers:
+                try:
+                    data = await self.fetch()
+                except Exception:
+                    data = {"qrcode": None, "qr_format": None, "status": "error",
+                            "message": "Não foi possível obter o status do servidor."}
+                self.fetched_at = time.monotonic()
+                if self.last is None or _signature(data) != _signature(self.last):
+                    self.last = data
+                    self._publish(data)
+                elif self._waiting:
+                    self._publish(data, self._waiting)
+                self._waiting.clear()
+                await asyncio.sleep(QR_STREAM_POLL_MS / 1000.0)
+        finally:
+            if _watchers.get(self.instance) is self and not self.subscribers:
+                _watchers.pop(self.instance, None)
+
+
+def subscribe_watcher(instance: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[InstanceWatcher, asyncio.Queue]:
+    """
+    Localiza (ou cria) o watcher da instância e assina, sem await no meio: o
+    watcher não pode encerrar entre a busca e a assinatura.
+    """
+    w = _watchers.get(instance)
+    loop = asyncio.get_running_loop()
+    if w is None or (w.task is not None and w.task.get_loop() is not loop):
+        w = InstanceWatcher(instance, fetch)
+        _watchers[instance] = w
+    return w, w.subscribe()
+
+
+def sse_event(data: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
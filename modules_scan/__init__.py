@@ -1,8 +1,16 @@
 # modulo/__init__.py
 """
 Define o pacote 'modulo'. Mantém a API pública de alto nível.
+
+main_loop é carregado sob demanda: o app importa só os módulos de que
+precisa (core_links, http_client, ...) sem trazer o loop do scanner junto.
 """
 
-from .core_loop import main_loop  # opcional: facilitar import externamente
+__all__ = ["main_loop"]
+
 
-__all__ = ["main_loop"]
\ No newline at end of file
+def __getattr__(name):
+    if name == "main_loop":
+        from .core_loop import main_loop
+        return main_loop
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
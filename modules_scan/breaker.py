@@ -0,0 +1,160 @@
+# modulo/breaker.py
+"""
+Circuit breaker por endpoint lógico da Evolution e orçamento de retry,
+compartilhados por todas as threads (scanner) e pelo event loop (app) do processo.
+
+  fechado   -> chamadas normais; BREAKER_FAILURES falhas seguidas abrem o circuito
+  aberto    -> falha imediata (CircuitOpenError) por BREAKER_OPEN_SECONDS
+  half-open -> até BREAKER_HALF_OPEN_PROBES sondas; sucesso fecha, falha reabre
+
+Falha = erro de transporte (timeout/conexão) ou resposta 5xx. As transições
+são logadas e o estado vai para a métrica evolution_breaker_state.
+"""
+
+import threading
+import time
+from typing import Any, Dict
+
+from . import config, metrics
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """
+    Upstream indisponível: a chamada foi recusada sem ir à rede.
+    """
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"circuit breaker aberto para '{endpoint}' (nova tentativa em {retry_in:.0f}s)")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        metrics.UPSTREAM_BREAKER_STATE.set(0, endpoint=endpoint)
+
+    def _transition(self, state: str, reason: str = ""):
+        previous, self.state = self.state, state
+        metrics.UPSTREAM_BREAKER_STATE.set(_STATE_VALUE[state], endpoint=self.endpoint)
+        if state == OPEN:
+            print(f"[WARN] Circuit breaker '{self.endpoint}': {previous} -> aberto ({reason}); "
+                  f"falhando rápido por {config.BREAKER_OPEN_SECONDS:.0f}s.")
+        elif state == CLOSED:
+            print(f"[OK] Circuit breaker '{self.endpoint}': {previous} -> fechado (upstream respondeu).")
+        else:
+            print(f"[INFO] Circuit breaker '{self.endpoint}': {previous} -> half-open (sondando upstream).")
+
+    def before_call(self):
+        """
+        Reserva a chamada ou levanta CircuitOpenError.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == OPEN:
+                remaining = self.opened_at + config.BREAKER_OPEN_SECONDS - now
+                if remaining > 0:
+                    self.rejected += 1
+                    metrics.UPSTREAM_FAST_FAILS.inc(endpoint=self.endpoint)
+                    raise CircuitOpenError(self.endpoint, remaining)
+                self.probes = 0
+                self._transition(HALF_OPEN)
+            if self.probes >= config.BREAKER_HALF_OPEN_PROBES:
+                self.rejected += 1
+                metrics.UPSTREAM_FAST_FAILS.inc(endpoint=self.endpoint)
+                raise CircuitOpenError(self.endpoint, 0)
+            self.probes += 1
+
+    def record(self, ok: bool, reason: str = ""):
+        with self._lock:
+            if ok:
+                self.failures = 0
+                if self.state != CLOSED:
+                    self._transition(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= config.BREAKER_FAILURES):
+                self.opened_at = time.monotonic()
+                self._transition(OPEN, reason or f"{self.failures} falha(s) seguida(s)")
+
+    def release_probe(self):
+        """
+        Sonda que não chegou a um veredito (ex.: cancelada): libera a vaga.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN and self.probes > 0:
+                self.probes -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            snap = {"state": self.state, "consecutive_failures": self.failures, "rejected": self.rejected}
+            if self.state == OPEN:
+                snap["retry_in"] = max(0.0, self.opened_at + config.BREAKER_OPEN_SECONDS - time.monotonic())
+            return snap
+
+
+class RetryBudget:
+    """
+    Balde de fichas: cada requisição deposita HTTP_RETRY_RATIO, o tempo deposita
+    HTTP_RETRY_MIN_PER_S por segundo (até HTTP_RETRY_BUDGET_MAX); cada retry gasta 1.
+    Evita que retries multipliquem a carga sobre um upstream já degradado.
+    """
+    def __init__(self):
+        self.tokens = config.HTTP_RETRY_BUDGET_MAX
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, deposit: float):
+        now = time.monotonic()
+        self.tokens = min(config.HTTP_RETRY_BUDGET_MAX,
+                          self.tokens + deposit + (now - self.updated) * config.HTTP_RETRY_MIN_PER_S)
+        self.updated = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill(config.HTTP_RETRY_RATIO)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill(0.0)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+retry_budget = RetryBudget()
+
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    b = _breakers.get(endpoint)
+    if b is None:
+        with _breakers_lock:
+            b = _breakers.get(endpoint)
+            if b is None:
+                b = _breakers[endpoint] = CircuitBreaker(endpoint)
+    return b
+
+
+def status() -> Dict[str, Any]:
+    """
+    Estado de todos os breakers e do orçamento de retry (rota de status/logs).
+    """
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {
+        "breakers": {name: b.snapshot() for name, b in sorted(breakers.items())},
+        "retry_budget": round(retry_budget.tokens, 2),
+    }
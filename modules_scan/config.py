@@ -1,21 +1,100 @@
 # modulo/config.py
 """
 Carrega variáveis de ambiente e configurações globais.
-Também desabilita os warnings de SSL (apenas para ambientes controlados).
+É o único ponto que lê o .env: modules_app.config e core_links partem daqui.
+(Os warnings de SSL de verify=False são desligados em http_client, ao criar a sessão.)
 """
 
 import os
-import requests
 from dotenv import load_dotenv
 
-# Desabilita warnings de SSL quando verify=False (use HTTPS em produção!)
-requests.packages.urllib3.disable_warnings()
-
-# Carrega .env
+# Carrega .env (uma vez por processo, para scanner e app)
 load_dotenv()
 
+# Redis compartilhado e URL pública da página de conexão
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+BASE_URL = os.getenv("BASE_URL")
+
 # Variáveis de ambiente
 API_KEY = os.getenv("EVOLUTION_GLOBAL_KEY")
 DOMAIN_ENV = os.getenv("EVOLUTION_DOMAIN", "").strip()
 EVOLUTION_INSTANCE_NAME_ADMIN = os.getenv("EVOLUTION_INSTANCE_NAME_ADMIN")
-EVOLUTION_INSTANCE_KEY_ADMIN = os.getenv("EVOLUTION_INSTANCE_KEY_ADMIN")
\ No newline at end of file
+EVOLUTION_INSTANCE_KEY_ADMIN = os.getenv("EVOLUTION_INSTANCE_KEY_ADMIN")
+
+# Varredura concorrente: nº máximo de instâncias processadas em paralelo
+SCAN_CONCURRENCY = max(1, int(os.getenv("SCAN_CONCURRENCY", "16")))
+
+# Cliente HTTP compartilhado (pool de conexões keep-alive)
+HTTP_POOL_CONNECTIONS = max(1, int(os.getenv("HTTP_POOL_CONNECTIONS", "4")))
+HTTP_POOL_SIZE = max(1, int(os.getenv("HTTP_POOL_SIZE", str(max(SCAN_CONCURRENCY, 16)))))
+
+# Timeouts (s) por endpoint lógico; sobrescreva com HTTP_TIMEOUT_<ENDPOINT>
+HTTP_TIMEOUT_DEFAULT = float(os.getenv("HTTP_TIMEOUT_DEFAULT", "10"))
+HTTP_TIMEOUTS = {
+    name: float(os.getenv(f"HTTP_TIMEOUT_{name.upper()}", str(default)))
+    for name, default in {
+        "fetch_instances": 20,
+        "connect": 10,
+        "logout": 15,
+        "send_text": 15,
+        "profile": 10,
+        "profile_photo": 10,
+    }.items()
+}
+
+# Circuit breaker por endpoint da Evolution: abre após N falhas seguidas (timeout,
+# conexão ou 5xx), falha rápido por BREAKER_OPEN_SECONDS e então libera sondas (half-open)
+BREAKER_FAILURES = max(1, int(os.getenv("BREAKER_FAILURES", "5")))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_PROBES = max(1, int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1")))
+
+# Retry (só GET/DELETE, erro de conexão ou 502/503/504) limitado por orçamento:
+# cada requisição deposita HTTP_RETRY_RATIO fichas, mais HTTP_RETRY_MIN_PER_S por segundo
+HTTP_RETRY_MAX = max(0, int(os.getenv("HTTP_RETRY_MAX", "1")))
+HTTP_RETRY_RATIO = float(os.getenv("HTTP_RETRY_RATIO", "0.1"))
+HTTP_RETRY_MIN_PER_S = float(os.getenv("HTTP_RETRY_MIN_PER_S", "1"))
+HTTP_RETRY_BUDGET_MAX = float(os.getenv("HTTP_RETRY_BUDGET_MAX", "10"))
+
+# Agendador por instância (segundos)
+SCAN_FLEET_REFRESH = float(os.getenv("SCAN_FLEET_REFRESH", "60"))  # releitura de fetchInstances
+SCAN_POLL_FAST = float(os.getenv("SCAN_POLL_FAST", "15"))          # qr_code / connecting
+SCAN_POLL_IDLE = float(os.getenv("SCAN_POLL_IDLE", "60"))          # demais estados
+SCAN_POLL_SLOW = float(os.getenv("SCAN_POLL_SLOW", "300"))         # connected
+SCAN_BACKOFF_BASE = float(os.getenv("SCAN_BACKOFF_BASE", "15"))    # error / unknown
+SCAN_BACKOFF_MAX = float(os.getenv("SCAN_BACKOFF_MAX", "600"))
+SCAN_FORCE_RECHECK = float(os.getenv("SCAN_FORCE_RECHECK", "3600"))  # reconsulta conectadas inalteradas
+
+# Tabela de estado por instância gravada no Redis para retomar após reinício (0 desativa)
+SCAN_STATE_SAVE_INTERVAL = float(os.getenv("SCAN_STATE_SAVE_INTERVAL", "30"))
+SCAN_STATE_TTL = int(os.getenv("SCAN_STATE_TTL", "86400"))
+
+# Fila de envio dos links (outbox)
+OUTBOX_INLINE_WORKER = os.getenv("OUTBOX_INLINE_WORKER", "1") == "1"  # 0 = use worker.py
+OUTBOX_WORKER_ID = os.getenv("OUTBOX_WORKER_ID", "")
+OUTBOX_RATE_PER_SEC = float(os.getenv("OUTBOX_RATE_PER_SEC", "1"))
+OUTBOX_MAX_ATTEMPTS = max(1, int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5")))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "30"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "900"))
+# Porta do /metrics do worker.py avulso (0 desativa; o worker embutido usa a do scanner)
+OUTBOX_METRICS_PORT = int(os.getenv("OUTBOX_METRICS_PORT", "0"))
+
+# Modo fragmentado (várias réplicas do scanner dividem as instâncias)
+SCAN_SHARDING = os.getenv("SCAN_SHARDING", "0") == "1"
+SCAN_REPLICA_ID = os.getenv("SCAN_REPLICA_ID", "")
+SCAN_SHARD_HEARTBEAT = float(os.getenv("SCAN_SHARD_HEARTBEAT", "5"))
+SCAN_SHARD_LEASE = float(os.getenv("SCAN_SHARD_LEASE", "20"))
+SCAN_SHARD_VNODES = max(1, int(os.getenv("SCAN_SHARD_VNODES", "64")))
+
+# Porta do endpoint /metrics do scanner (0 desativa)
+SCANNER_METRICS_PORT = int(os.getenv("SCANNER_METRICS_PORT", "9100"))
+
+# Webhook da Evolution (connection.update / qrcode.updated). Sem segredo = desativado.
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_MODE = bool(WEBHOOK_SECRET)
+WEBHOOK_STATE_TTL = int(os.getenv("WEBHOOK_STATE_TTL", "300"))
+WEBHOOK_EVENTS_MAXLEN = int(os.getenv("WEBHOOK_EVENTS_MAXLEN", "10000"))
+# Com webhook ativo, o polling de qr_code/connecting vira só reconciliação
+SCAN_WEBHOOK_RECONCILE = float(os.getenv("SCAN_WEBHOOK_RECONCILE", "120"))
+
+# Perfil por instância (nome, número, foto) gravado por quem leu o fetchInstances (s)
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "600"))
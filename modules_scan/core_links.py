@@ -1,13 +1,101 @@
 # core_links.py (Redis)
-import os, time, json, secrets
-from typing import Tuple, Optional, Dict, Any
-from dotenv import load_dotenv
+import os, time, json, secrets, asyncio, weakref, threading
+from collections import OrderedDict
+from typing import Tuple, Optional, Dict, Any, Iterable, Set
 import redis
+import redis.asyncio as aioredis
 
-load_dotenv()
-BASE_URL = os.getenv("BASE_URL")
-REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
-r = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+from . import config, metrics
+
+BASE_URL = config.BASE_URL
+REDIS_URL = config.REDIS_URL
+
+
+class InstrumentedRedis(redis.Redis):
+    """
+    Cliente Redis que registra a latência de cada comando (e de cada pipeline).
+    """
+    def execute_command(self, *args, **options):
+        with metrics.REDIS_SECONDS.time(command=str(args[0]).lower()):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        p = super().pipeline(transaction=transaction, shard_hint=shard_hint)
+        execute = p.execute
+
+        def timed_execute(raise_on_error=True):
+            with metrics.REDIS_SECONDS.time(command="pipeline"):
+                return execute(raise_on_error)
+
+        p.execute = timed_execute
+        return p
+
+
+# Cliente síncrono compartilhado, criado no primeiro uso (get_redis), não no import
+r: Optional[redis.Redis] = None
+_r_lock = threading.Lock()
+
+def get_redis() -> redis.Redis:
+    global r
+    if r is None:
+        with _r_lock:
+            if r is None:
+                r = InstrumentedRedis.from_url(REDIS_URL, decode_responses=True)
+    return r
+
+
+class InstrumentedAsyncRedis(aioredis.Redis):
+    """
+    Versão assíncrona (usada pelas rotas async do app), com a mesma instrumentação.
+    """
+    async def execute_command(self, *args, **options):
+        with metrics.REDIS_SECONDS.time(command=str(args[0]).lower()):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        p = super().pipeline(transaction=transaction, shard_hint=shard_hint)
+        execute = p.execute
+
+        async def timed_execute(raise_on_error=True):
+            with metrics.REDIS_SECONDS.time(command="pipeline"):
+                return await execute(raise_on_error)
+
+        p.execute = timed_execute
+        return p
+
+
+# Um cliente async por event loop (as conexões ficam presas ao loop que as criou)
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = weakref.WeakKeyDictionary()
+
+def get_async_redis() -> aioredis.Redis:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = InstrumentedAsyncRedis.from_url(REDIS_URL, decode_responses=True)
+        _async_clients[loop] = client
+    return client
+
+async def aclose_async_redis():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+# Scripts Lua registrados uma vez por cliente (register_script recalcula o SHA1 do
+# fonte a cada chamada; o objeto Script guarda o SHA e usa EVALSHA)
+_scripts: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+_scripts_lock = threading.Lock()
+
+def _script(client, source: str):
+    scripts = _scripts.get(client)
+    script = scripts.get(source) if scripts is not None else None
+    if script is None:
+        with _scripts_lock:
+            scripts = _scripts.setdefault(client, {})
+            script = scripts.get(source)
+            if script is None:
+                script = scripts[source] = client.register_script(source)
+    return script
 
 def _now() -> int:
     return int(time.time())
@@ -18,60 +106,271 @@ def _key_token(tok: str) -> str:
 def _key_connect_active(instance: str) -> str:
     return f"connect_active:{instance}"
 
+def _key_instance_tokens(instance: str) -> str:
+    # Índice secundário: tokens emitidos para a instância
+    return f"instance_tokens:{instance}"
+
+# Conjunto de instâncias que possuem tokens/links indexados
+KEY_LINK_INSTANCES = "link_instances"
+
+# ---------------------------------------------------------------------------
+# Cache local de tokens validados
+# ---------------------------------------------------------------------------
+# Os endpoints de polling validam o mesmo token a cada poucos segundos; o
+# payload é imutável, então guardamos o resultado em memória (LRU limitado)
+# até o menor entre o TTL restante do token e TOKEN_CACHE_MAX_AGE. Encurtar ou
+# apagar um token invalida a entrada local e publica no canal
+# TOKEN_INVALIDATION_CHANNEL para os demais processos (listen_token_invalidations).
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_MAX_AGE = float(os.getenv("TOKEN_CACHE_MAX_AGE", "30"))
+TOKEN_INVALIDATION_CHANNEL = "token_invalidate"
+
+
+class _TokenCache:
+    def __init__(self, max_size: int, max_age: float):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._items: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(token)
+            if item is None:
+                return None
+            expires, payload = item
+            if expires <= time.monotonic():
+                del self._items[token]
+                return None
+            self._items.move_to_end(token)
+            return payload
+
+    def put(self, token: str, payload: Dict[str, Any], ttl_ms: int):
+        if self.max_size <= 0 or self.max_age <= 0:
+            return
+        # ttl_ms < 0: token sem expiração (-1) ou inexistente (-2)
+        max_age = self.max_age if ttl_ms < 0 else min(self.max_age, ttl_ms / 1000.0)
+        if max_age <= 0:
+            return
+        with self._lock:
+            self._items[token] = (time.monotonic() + max_age, payload)
+            self._items.move_to_end(token)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, tokens: Iterable[str]):
+        with self._lock:
+            for tok in tokens:
+                self._items.pop(tok, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_token_cache = _TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_MAX_AGE)
+
+
+def _invalidate_tokens(tokens: Iterable[str]):
+    """
+    Remove os tokens do cache local e avisa os outros processos.
+    """
+    tokens = [t for t in tokens if t]
+    if not tokens:
+        return
+    _token_cache.invalidate(tokens)
+    try:
+        get_redis().publish(TOKEN_INVALIDATION_CHANNEL, " ".join(tokens))
+    except redis.RedisError:
+        pass  # quem não receber expira a entrada em TOKEN_CACHE_MAX_AGE
+
+
+async def listen_token_invalidations():
+    """
+    Consome TOKEN_INVALIDATION_CHANNEL e descarta as entradas locais
+    correspondentes. Roda como task no event loop do app até ser cancelada.
+    """
+    while True:
+        pubsub = get_async_redis().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(TOKEN_INVALIDATION_CHANNEL)
+            async for msg in pubsub.listen():
+                if msg and msg.get("type") == "message":
+                    _token_cache.invalidate((msg.get("data") or "").split())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Mensagens podem ter se perdido enquanto desconectado
+            _token_cache.clear()
+            print(f"[WARN] Invalidação de tokens: assinatura perdida ({e}); reconectando.")
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
 def init_db():
     """
     Em Redis não há schema; só verificamos a conexão.
     Mantemos a função por compatibilidade com o restante do projeto.
     """
     try:
-        r.ping()
+        get_redis().ping()
     except Exception as e:
         print(f"[WARN] Redis indisponível no init_db(): {e}")
 
+# ---------------------------------------------------------------------------
+# Formato do token no Redis
+# ---------------------------------------------------------------------------
+# v2 (atual): token:{tok} HASH com campos planos e curtos, lidos com HMGET
+#   v=2  p=<page>  i=<instance>  k=<apikey>  [o=1 se one_time]  [x=<JSON dos demais campos>]
+#   A expiração é só o TTL da chave (expires_at/used_at não são mais gravados).
+# v1 (legado): expires_at, payload (JSON com page/instance/apikey), one_time, used_at.
+#   Continua legível; a varredura completa da limpeza converte para v2 (_MIGRATE_LUA).
+
+TOKEN_FORMAT_VERSION = "2"
+_TOKEN_FIELDS = ("p", "i", "k", "x", "payload")  # ordem do HMGET dos leitores
+_PAYLOAD_FIELDS = {"page": "p", "instance": "i", "apikey": "k"}
+
+
+def _token_mapping(payload: Dict[str, Any], one_time: bool = False) -> Dict[str, str]:
+    mapping = {"v": TOKEN_FORMAT_VERSION}
+    extra = {}
+    for name, value in (payload or {}).items():
+        if name in _PAYLOAD_FIELDS and isinstance(value, str):
+            mapping[_PAYLOAD_FIELDS[name]] = value
+        else:
+            extra[name] = value
+    if extra:
+        mapping["x"] = json.dumps(extra, ensure_ascii=False, separators=(",", ":"))
+    if one_time:
+        mapping["o"] = "1"
+    return mapping
+
+
+def _payload_from_fields(page, instance, apikey, extra, legacy) -> Dict[str, Any]:
+    """
+    Payload a partir dos campos do HMGET (_TOKEN_FIELDS), v2 ou v1.
+    """
+    if legacy is not None:
+        return json.loads(legacy or "{}")
+    payload = json.loads(extra) if extra else {}
+    for name, value in (("page", page), ("instance", instance), ("apikey", apikey)):
+        if value is not None:
+            payload[name] = value
+    return payload
+
+
 def _row_to_payload_from_hash(h: Dict[str, str]) -> Dict[str, Any]:
     """
-    Converte o hash do Redis no mesmo formato que o código original espera.
+    Converte o hash do Redis (v2 ou v1) no mesmo formato que o código original espera.
     """
     exp_str = h.get("expires_at")
-    one_time_str = h.get("one_time", "0")
     used_at_str = h.get("used_at")  # pode ser vazio
 
     return {
         "expires_at": int(exp_str) if exp_str else 0,
-        "payload": json.loads(h.get("payload") or "{}"),
-        "one_time": bool(int(one_time_str) if one_time_str else 0),
+        "payload": _payload_from_fields(*(h.get(f) for f in _TOKEN_FIELDS)),
+        "one_time": h.get("o") == "1" or h.get("one_time") == "1",
         "used_at": int(used_at_str) if (used_at_str and used_at_str.isdigit()) else None
     }
 
-def _get_active_token_for_instance(instance: str) -> Optional[str]:
-    """
-    Retorna um token ATIVO (ainda válido no Redis) para a mesma instância e page='connect', se existir.
-    Implementado via chave auxiliar connect_active:{instance} -> token.
-    """
-    try:
-        tok = r.get(_key_connect_active(instance))
-        if not tok:
-            return None
-        # Verifica se o token ainda existe (não expirou)
-        if not r.exists(_key_token(tok)):
-            # Limpa mapeamento “zumbi”
-            r.delete(_key_connect_active(instance))
-            return None
-
-        # Por garantia, checa se o token realmente é da page 'connect' e da mesma instância.
-        h = r.hgetall(_key_token(tok))
-        if not h:
-            r.delete(_key_connect_active(instance))
-            return None
-        data = _row_to_payload_from_hash(h)
-        pl = data["payload"] or {}
-        if pl.get("page") != "connect" or pl.get("instance") != instance:
-            r.delete(_key_connect_active(instance))
-            return None
-
-        return tok
-    except Exception:
-        return None
+# ---------------------------------------------------------------------------
+# Scripts Lua: ciclo de vida do token em 1 ida ao Redis, atômico
+# ---------------------------------------------------------------------------
+# As chaves token:{tok} e connect_active:{instance} derivadas do payload são
+# montadas dentro do script (prefixos em ARGV); vale para Redis único, não Cluster.
+
+# Página e instância de um token (v2: campos p/i; v1: JSON em payload).
+_TOKEN_TARGET_LUA = """
+local function token_target(tkey)
+  local f = redis.call('HMGET', tkey, 'p', 'i', 'payload')
+  if f[1] then return f[1], f[2] end
+  if f[3] then
+    local ok, pl = pcall(cjson.decode, f[3])
+    if ok and type(pl) == 'table' then return pl['page'], pl['instance'] end
+  end
+  return nil, nil
+end
+"""
+
+# KEYS: connect_active:{inst}, instance_tokens:{inst}, link_instances
+# ARGV: instance, token candidato, ttl, apikey, prefixo token:
+# Retorna {token, 1} se criou ou {token, 0} se reaproveitou o ativo.
+_GET_OR_CREATE_LUA = _TOKEN_TARGET_LUA + """
+local active = redis.call('GET', KEYS[1])
+if active then
+  local page, instance = token_target(ARGV[5] .. active)
+  if page == 'connect' and instance == ARGV[1] then
+    return {active, 0}
+  end
+  redis.call('DEL', KEYS[1])
+end
+local tok = ARGV[2]
+local tkey = ARGV[5] .. tok
+local ttl = tonumber(ARGV[3])
+redis.call('HSET', tkey, 'v', '2', 'p', 'connect', 'i', ARGV[1], 'k', ARGV[4])
+redis.call('EXPIRE', tkey, ttl)
+redis.call('SADD', KEYS[2], tok)
+redis.call('EXPIRE', KEYS[2], ttl)
+redis.call('SADD', KEYS[3], ARGV[1])
+redis.call('SET', KEYS[1], tok, 'EX', ttl)
+return {tok, 1}
+"""
+
+# KEYS: token:{tok}
+# Retorna {pttl, p, i, k, x, payload} (campos de _TOKEN_FIELDS) ou {-2} se o token não existe.
+_VALIDATE_LUA = """
+local pttl = redis.call('PTTL', KEYS[1])
+if pttl == -2 then return {-2} end
+local f = redis.call('HMGET', KEYS[1], 'p', 'i', 'k', 'x', 'payload')
+return {pttl, f[1], f[2], f[3], f[4], f[5]}
+"""
+
+# KEYS: token:{tok}
+# ARGV: novo ttl, prefixo connect_active:, canal de invalidação, token
+# Retorna 1 se encurtou (e publicou a invalidação), 0 se o token não existe.
+_SHORTEN_LUA = _TOKEN_TARGET_LUA + """
+local ttl = tonumber(ARGV[1])
+if redis.call('EXPIRE', KEYS[1], ttl) == 0 then return 0 end
+local page, instance = token_target(KEYS[1])
+if page == 'connect' and type(instance) == 'string' then
+  redis.call('EXPIRE', ARGV[2] .. instance, ttl)
+end
+redis.call('PUBLISH', ARGV[3], ARGV[4])
+return 1
+"""
+
+# KEYS: token:{tok}
+# Converte um token v1 para v2 no lugar (o TTL da chave é preservado).
+# Retorna 1 se converteu, 0 se já era v2/inexistente/ilegível.
+_MIGRATE_LUA = """
+local raw = redis.call('HGET', KEYS[1], 'payload')
+if not raw then return 0 end
+local ok, pl = pcall(cjson.decode, raw)
+if not ok or type(pl) ~= 'table' then return 0 end
+local fields = {'v', '2'}
+for name, short in pairs({page = 'p', instance = 'i', apikey = 'k'}) do
+  if type(pl[name]) == 'string' then
+    table.insert(fields, short)
+    table.insert(fields, pl[name])
+    pl[name] = nil
+  end
+end
+if next(pl) ~= nil then
+  table.insert(fields, 'x')
+  table.insert(fields, cjson.encode(pl))
+end
+if redis.call('HGET', KEYS[1], 'one_time') == '1' then
+  table.insert(fields, 'o')
+  table.insert(fields, '1')
+end
+redis.call('HSET', KEYS[1], unpack(fields))
+redis.call('HDEL', KEYS[1], 'payload', 'expires_at', 'one_time', 'used_at')
+return 1
+"""
 
 def create_token(ttl_seconds: int, payload: Dict[str, Any], one_time: bool = False) -> Optional[str]:
     """
@@ -79,17 +378,18 @@ def create_token(ttl_seconds: int, payload: Dict[str, Any], one_time: bool = Fal
     """
     try:
         token = secrets.token_urlsafe(16)
-        expires_at = _now() + int(ttl_seconds)
         key = _key_token(token)
 
-        with r.pipeline(transaction=True) as p:
-            p.hset(key, mapping={
-                "expires_at": str(expires_at),
-                "payload": json.dumps(payload or {}, ensure_ascii=False),
-                "one_time": "1" if one_time else "0",
-                "used_at": ""  # compatível com o código original
-            })
+        instance = (payload or {}).get("instance")
+
+        with get_redis().pipeline(transaction=True) as p:
+            p.hset(key, mapping=_token_mapping(payload, one_time))
             p.expire(key, int(ttl_seconds))
+            if instance:
+                idx = _key_instance_tokens(instance)
+                p.sadd(idx, token)
+                p.expire(idx, int(ttl_seconds))
+                p.sadd(KEY_LINK_INSTANCES, instance)
             p.execute()
 
         return token
@@ -107,45 +407,35 @@ def get_or_create_connect_link(instance: str, apikey: str, ttl_seconds: int = 8*
     Garante NO MÁXIMO 1 link 'connect' ativo por instância.
     Retorna (token, full_link, created_new).
     """
-    # 1) Reutiliza se já existir
-    existing = _get_active_token_for_instance(instance)
-    if existing:
-        return existing, build_link(existing), False
-
-    # 2) Cria um novo 'connect'
-    payload = {"page": "connect", "instance": instance, "apikey": apikey}
-    tok = create_token(ttl_seconds, payload, one_time=False)
-    if not tok:
+    ttl = int(ttl_seconds)
+    try:
+        tok, created = _script(get_redis(), _GET_OR_CREATE_LUA)(
+            keys=[_key_connect_active(instance), _key_instance_tokens(instance), KEY_LINK_INSTANCES],
+            args=[instance, secrets.token_urlsafe(16), ttl, apikey, _key_token("")],
+        )
+    except Exception:
         return "", "", False
+    return tok, build_link(tok), bool(int(created))
 
-    # 3) Tenta registrar como ativo (NX = só se não existir ainda)
-    key_active = _key_connect_active(instance)
-    ok = r.set(key_active, tok, ex=int(ttl_seconds), nx=True)
-    if ok:
-        return tok, build_link(tok), True
-
-    # 4) Corrida: alguém registrou antes; usa o existente e remove o novo
-    existing = _get_active_token_for_instance(instance)
-    if existing:
-        r.delete(_key_token(tok))
-        return existing, build_link(existing), False
-
-    # 5) Cenário raro: nenhum ativo mesmo após NX falhar -> registra sem NX
-    r.set(key_active, tok, ex=int(ttl_seconds))
-    return tok, build_link(tok), True
+def _validation_result(reply, token: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+    pttl, fields = int(reply[0]), reply[1:]
+    if pttl == -2:
+        return False, "Token inválido ou não encontrado.", None
+    payload = _payload_from_fields(*fields)
+    _token_cache.put(token, payload, pttl)
+    return True, "OK", dict(payload)
 
 def validate_token(token: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
     """
     Valida o token: existe? então é válido (TTL cuida da expiração).
+    Consulta o cache local primeiro; no Redis é uma única ida (script: HMGET + PTTL).
     """
+    cached = _token_cache.get(token)
+    if cached is not None:
+        return True, "OK", dict(cached)
     try:
-        key = _key_token(token)
-        if not r.exists(key):
-            return False, "Token inválido ou não encontrado.", None
-
-        h = r.hgetall(key)
-        data = _row_to_payload_from_hash(h)
-        return True, "OK", data["payload"]
+        reply = _script(get_redis(), _VALIDATE_LUA)(keys=[_key_token(token)])
+        return _validation_result(reply, token)
     except Exception:
         return False, "Erro ao validar token.", None
 
@@ -155,60 +445,175 @@ def shorten_after_connected(token: str, seconds: int = 30):
     e sincroniza o TTL do mapeamento connect_active:{instance}, se aplicável.
     """
     try:
-        key = _key_token(token)
-        if not r.exists(key):
-            return
+        new_ttl = max(5, int(seconds))
+        args = [new_ttl, _key_connect_active(""), TOKEN_INVALIDATION_CHANNEL, token]
+        if _script(get_redis(), _SHORTEN_LUA)(keys=[_key_token(token)], args=args):
+            _token_cache.invalidate([token])
+    except Exception:
+        pass
+
+async def avalidate_token(token: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+    """
+    Versão async de validate_token (rotas do app).
+    """
+    cached = _token_cache.get(token)
+    if cached is not None:
+        return True, "OK", dict(cached)
+    try:
+        reply = await _script(get_async_redis(), _VALIDATE_LUA)(keys=[_key_token(token)])
+        return _validation_result(reply, token)
+    except Exception:
+        return False, "Erro ao validar token.", None
 
+async def ashorten_after_connected(token: str, seconds: int = 30):
+    """
+    Versão async de shorten_after_connected (rotas do app).
+    """
+    try:
         new_ttl = max(5, int(seconds))
-        r.expire(key, new_ttl)
-        # Atualiza expires_at (informativo)
-        r.hset(key, "expires_at", str(_now() + new_ttl))
-
-        # Se for um token 'connect', encurta o mapeamento por instância
-        h = r.hgetall(key)
-        if h:
-            data = _row_to_payload_from_hash(h)
-            pl = data["payload"] or {}
-            if pl.get("page") == "connect" and pl.get("instance"):
-                r.expire(_key_connect_active(pl["instance"]), new_ttl)
+        args = [new_ttl, _key_connect_active(""), TOKEN_INVALIDATION_CHANNEL, token]
+        if await _script(get_async_redis(), _SHORTEN_LUA)(keys=[_key_token(token)], args=args):
+            _token_cache.invalidate([token])
     except Exception:
         pass
 
-import json
+# ---------------------------------------------------------------------------
+# Limpeza de links órfãos
+# ---------------------------------------------------------------------------
+# Em regime normal, só as instâncias que SAÍRAM da frota desde a última
+# chamada são limpas (via índice instance_tokens:{instance}), então o custo é
+# proporcional ao nº de órfãos. Uma varredura completa com SCAN (sem KEYS) roda
+# na primeira chamada do processo, para cobrir tokens antigos sem índice, e a
+# reconciliação pelo índice roda a cada CLEANUP_FULL_INTERVAL segundos.
+
+CLEANUP_BATCH = int(os.getenv("CLEANUP_BATCH", "500"))
+CLEANUP_FULL_INTERVAL = int(os.getenv("CLEANUP_FULL_INTERVAL", "3600"))
+
+_cleanup_state: Dict[str, Any] = {"known": None, "last_full": 0.0}
+
+
+def _chunks(seq, size: int):
+    buf = []
+    for item in seq:
+        buf.append(item)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+def _purge_instances(instances: Iterable[str]) -> int:
+    """
+    Remove connect_active, tokens indexados e o próprio índice das instâncias dadas.
+    Retorna a quantidade de tokens removidos.
+    """
+    removed = 0
+    for batch in _chunks(instances, CLEANUP_BATCH):
+        with get_redis().pipeline(transaction=False) as p:
+            for inst in batch:
+                p.smembers(_key_instance_tokens(inst))
+            token_sets = p.execute()
+
+        with get_redis().pipeline(transaction=False) as p:
+            for inst, toks in zip(batch, token_sets):
+                for tok in toks or ():
+                    p.delete(_key_token(tok))
+                p.delete(_key_instance_tokens(inst), _key_connect_active(inst))
+                p.srem(KEY_LINK_INSTANCES, inst)
+            p.execute()
+
+        _invalidate_tokens(tok for toks in token_sets for tok in (toks or ()))
+        for inst, toks in zip(batch, token_sets):
+            removed += len(toks or ())
+            print(f"[CLEANUP] Link órfão removido do Redis: {inst} ({len(toks or ())} token(s))")
+    return removed
+
 
-def cleanup_orphan_links(valid_instances: list[str]):
+def _full_scan_cleanup(valid: Set[str]) -> int:
+    """
+    Varredura completa com SCAN + pipelines: remove connect_active/token órfãos,
+    indexa tokens antigos (criados antes do índice) das instâncias válidas e
+    converte os que ainda estão no formato v1 (_MIGRATE_LUA).
+    """
+    removed = 0
+    migrated = 0
+    migrate = _script(get_redis(), _MIGRATE_LUA)
+
+    orphan_active = []
+    for key in get_redis().scan_iter(match="connect_active:*", count=CLEANUP_BATCH):
+        if key.split(":", 1)[-1] not in valid:
+            orphan_active.append(key)
+    for batch in _chunks(orphan_active, CLEANUP_BATCH):
+        get_redis().delete(*batch)
+        for key in batch:
+            print(f"[CLEANUP] Link órfão removido do Redis: {key.split(':', 1)[-1]}")
+
+    for keys in _chunks(get_redis().scan_iter(match="token:*", count=CLEANUP_BATCH), CLEANUP_BATCH):
+        with get_redis().pipeline(transaction=False) as p:
+            for key in keys:
+                p.hmget(key, "i", "payload")
+                p.ttl(key)
+            replies = p.execute()
+
+        to_delete = []
+        with get_redis().pipeline(transaction=False) as p:
+            for i, key in enumerate(keys):
+                (instance_name, legacy), ttl = replies[2 * i], replies[2 * i + 1]
+                if ttl == -2:
+                    continue  # expirou entre o SCAN e a leitura
+                if legacy is not None:
+                    try:
+                        instance_name = (json.loads(legacy) or {}).get("instance")
+                    except (json.JSONDecodeError, AttributeError):
+                        instance_name = None
+                if instance_name in valid:
+                    idx = _key_instance_tokens(instance_name)
+                    p.sadd(idx, key.split(":", 1)[-1])
+                    if ttl and ttl > 0:
+                        p.expire(idx, ttl)
+                    p.sadd(KEY_LINK_INSTANCES, instance_name)
+                    if legacy is not None:
+                        migrate(keys=[key], client=p)
+                        migrated += 1
+                else:
+                    to_delete.append(key)
+            if to_delete:
+                p.delete(*to_delete)
+            p.execute()
+
+        _invalidate_tokens(key.split(":", 1)[-1] for key in to_delete)
+        removed += len(to_delete)
+        if to_delete:
+            print(f"[CLEANUP] {len(to_delete)} token(s) órfão(s)/inválido(s) removido(s).")
+
+    if migrated:
+        print(f"[CLEANUP] {migrated} token(s) convertido(s) para o formato v{TOKEN_FORMAT_VERSION}.")
+
+    # Índice: instâncias registradas que não existem mais
+    orphan_indexed = [inst for inst in get_redis().sscan_iter(KEY_LINK_INSTANCES, count=CLEANUP_BATCH) if inst not in valid]
+    removed += _purge_instances(orphan_indexed)
+    return removed
+
+
+def cleanup_orphan_links(valid_instances: Iterable[str]):
     """
     Remove do Redis todos os links de instâncias que não estão mais ativas.
     """
-    # Limpa connect_active:*
-    keys = r.keys("connect_active:*")  # ajuste o prefixo real
-    for key in keys:
-        instance_name = key.split(":")[-1]
-        if instance_name not in valid_instances:
-            r.delete(key)
-            print(f"[CLEANUP] Link órfão removido do Redis: {instance_name}")
-    
-    # Limpa token:*
-    keys = r.keys("token:*")
-    for key in keys:
-        # Lê o hash da chave
-        data = r.hgetall(key)
-        if not data:
-            r.delete(key)
-            print(f"[CLEANUP] Token vazio removido: {key}")
-            continue
-
-        payload = data.get("payload")
-        if payload:
-            try:
-                payload_json = json.loads(payload)
-                instance_name = payload_json.get("instance")
-                if instance_name not in valid_instances:
-                    r.delete(key)
-                    print(f"[CLEANUP] Token de instância inválida removido: {key}")
-            except json.JSONDecodeError:
-                r.delete(key)
-                print(f"[CLEANUP] Token inválido (payload corrompido) removido: {key}")
+    valid = set(valid_instances)
+    known = _cleanup_state["known"]
+    now = time.monotonic()
+
+    try:
+        if known is None:
+            _full_scan_cleanup(valid)
+            _cleanup_state["last_full"] = now
+        elif now - _cleanup_state["last_full"] >= CLEANUP_FULL_INTERVAL:
+            orphan_indexed = [inst for inst in get_redis().sscan_iter(KEY_LINK_INSTANCES, count=CLEANUP_BATCH) if inst not in valid]
+            _purge_instances(orphan_indexed)
+            _cleanup_state["last_full"] = now
         else:
-            r.delete(key)
-            print(f"[CLEANUP] Token sem payload removido: {key}")
\ No newline at end of file
+            _purge_instances(known - valid)
+        _cleanup_state["known"] = valid
+    except redis.RedisError as e:
+        print(f"[WARN] Falha na limpeza de links órfãos: {e}")
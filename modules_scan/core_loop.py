@@ -2,93 +2,302 @@
 """
 Loop principal de varredura (scanner) exatamente como no algoritmo original,
 apenas reorganizado por módulos.
+
+A varredura de cada instância é independente das demais, então as instâncias
+são processadas em paralelo (até config.SCAN_CONCURRENCY por vez). Cada instância
+tem seu próprio intervalo de polling (ver scheduler.PollScheduler); a lista de
+instâncias é relida a cada config.SCAN_FLEET_REFRESH segundos, e instâncias
+conectadas que não mudaram desde a última checagem não são reconsultadas
+(ver snapshot.FleetSnapshot, gravado no Redis para retomar após reinício).
+Com SCAN_SHARDING=1, cada réplica processa só
+as instâncias que lhe cabem no anel de hash (ver sharding.ShardMembership).
+Com webhook ativo (WEBHOOK_SECRET), eventos da Evolution antecipam a instância
+e o estado recebido substitui a consulta; o polling vira reconciliação lenta.
 """
 
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
+from . import config, metrics, instance_state, profiles
 from .utils import normalize_number, number_from_owner_jid
 from .core_links import init_db, get_or_create_connect_link, cleanup_orphan_links
-from .evolution_api import fetch_instances_from_api, fetch_qr_code_status, logout_instance
-from .messaging import send_text_admin_to_client
+from .evolution_api import iter_instances_from_api, fetch_qr_code_status, logout_instance
+from .outbox import enqueue_link, start_worker_thread
+from .scheduler import PollScheduler
+from .snapshot import FleetSnapshot
+from .sharding import ShardMembership
 
-def main_loop():
-    init_db()
 
-    while True:
-        instances = fetch_instances_from_api()
-        instance_names = [item.get("name") for item in instances if item.get("name")]
+def process_instance(item: Dict[str, Any], numbers: Optional[Tuple[str, str]] = None) -> Dict[str, Any]:
+    """
+    Aplica a lógica de decisão a UMA instância.
+    Retorna {"instance", "status", "state"} (+ "qr_hash" quando há QR); "state" é o
+    estado efetivo usado na decisão (qr_code, connected, connecting, unknown, error,
+    idle, invalid) e define o próximo polling da instância.
+    `numbers` = (cadastro, ownerJid) já normalizados pela tabela de estado, se houver.
+    """
+    instance = item.get('name')
+    apikey = item.get('key')
+
+    if numbers is not None:
+        instance_number, owner_jid_number = numbers
+    else:
+        # número cadastrado (na API)
+        instance_number = normalize_number(item.get('instance_number') or item.get('customer_number'))
+        # número real do aparelho logado (ownerJid)
+        owner_jid_number = normalize_number(number_from_owner_jid(item.get('owner_jid') or ""))
+
+    conn_status_hint = (item.get('connection_status') or '').lower()
+
+    if not instance or not apikey:
+        print(f"[WARN] Registro inválido vindo da API: instance='{instance}', key presente? {bool(apikey)}")
+        return {"instance": instance, "status": "invalid", "state": "invalid"}
+
+    # Buscamos o status real antes de qualquer ação (estado recente do webhook, se houver)
+    status: Optional[Dict[str, Any]] = instance_state.get_state(instance)
+    if status is None:
+        with metrics.SWEEP_PHASE_SECONDS.time(phase="status"):
+            status = fetch_qr_code_status(instance, apikey)
+    s = status.get('status')
+    result = {"instance": instance, "status": s, "state": s}
+
+    # 1) Se tem QR, prioriza gerar/enviar link e NÃO tenta deslogar
+    if s == 'qr_code':
+        result["qr_hash"] = hashlib.sha1(str(status.get('qrcode')).encode()).hexdigest()[:16]
+        client_number = instance_number
+        token, link, created = get_or_create_connect_link(instance, apikey, ttl_seconds=4*60*60)
+        if created:
+            if not client_number:
+                print(f"[WARN] instance={instance}: 'number' ausente; não é possível enviar o link.")
+            elif enqueue_link(instance, token, client_number, link, ttl_seconds=4*60*60):
+                # O envio em si (com limite de taxa e retry) fica com o worker da fila
+                print(f"[OK] Link enfileirado p/ {client_number} (instance={instance})")
+            else:
+                print(f"[INFO] instance={instance}: link já enfileirado; nada a enviar agora.")
+        else:
+            print(f"[INFO] instance={instance}: link já existe/recente; nada a enviar agora.")
+        return result
+
+    # 2) Se está conectado, aí sim verificamos divergência de número e eventualmente deslogamos
+    if s == 'connected' or conn_status_hint in ('open', 'connected'):
+        if owner_jid_number and instance_number and owner_jid_number != instance_number:
+            print(f"[WARN] instance={instance}: divergência (ownerJid={owner_jid_number} != cadastro={instance_number}). Efetuando logout...")
+            with metrics.SWEEP_PHASE_SECONDS.time(phase="logout"):
+                ok, resp = logout_instance(instance, apikey)
+            if ok:
+                print(f"[OK] instance={instance}: logout realizado. Detalhe: {resp}")
+                get_or_create_connect_link(instance, apikey, ttl_seconds=4*60*60)
+            else:
+                print(f"[ERRO] instance={instance}: falha no logout -> {resp}")
+        else:
+            print(f"[OK] instance={instance}: conectada e sem divergência.")
+        result["state"] = "connected"
+        return result
+
+    # 3) Demais casos (não conectado): só aguardamos/otimizamos o polling
+    if s == 'unknown':
+        print(f"[INFO] instance={instance}: status desconhecido -> {status.get('raw')}")
+    elif s == 'error':
+        print(f"[ERRO] instance={instance}: {status.get('message')}")
+    else:
+        # ex.: estado 'close' ou sem estado definido
+        if conn_status_hint == 'connecting':
+            print(f"[INFO] instance={instance}: connecting, aguardando QR...")
+            result["state"] = "connecting"
+        else:
+            print(f"[INFO] instance={instance}: não conectada (hint='{conn_status_hint}').")
+            result["state"] = "idle"
+    return result
 
-        if not instances:
-            print("[INFO] Nenhuma instância retornada pela API. Aguardando...")
 
-        # 🧹 limpeza de links órfãos
-        cleanup_orphan_links(instance_names)
+def _safe_process_instance(item: Dict[str, Any], numbers: Optional[Tuple[str, str]] = None) -> Dict[str, Any]:
+    # Uma falha inesperada em uma instância não pode derrubar a varredura inteira
+    try:
+        return process_instance(item, numbers)
+    except Exception as e:
+        print(f"[ERRO] instance={item.get('name')}: falha inesperada na varredura -> {e}")
+        return {"instance": item.get('name'), "status": "error", "state": "error"}
 
-        next_sleep = 60  # padrão
 
-        for item in instances:
-            instance = item.get('name')
-            apikey = item.get('key')
+def run_sweep(instances: List[Dict[str, Any]], executor: ThreadPoolExecutor,
+              snapshot: Optional[FleetSnapshot] = None) -> List[Dict[str, Any]]:
+    """
+    Processa todas as instâncias em paralelo e retorna os resultados.
+    """
+    if not instances:
+        return []
+    if snapshot is None:
+        return list(executor.map(_safe_process_instance, instances))
+    return list(executor.map(_safe_process_instance, instances, [snapshot.numbers(item) for item in instances]))
 
-            # número cadastrado (na API)
-            instance_number = normalize_number(item.get('instance_number') or item.get('customer_number'))
-            # número real do aparelho logado (ownerJid)
-            owner_jid_number = normalize_number(number_from_owner_jid(item.get('owner_jid') or ""))
 
-            conn_status_hint = (item.get('connection_status') or '').lower()
+def fetch_fleet(profile_batch: int = 500) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Lê o fetchInstances em streaming: cada instância normalizada vai direto para o
+    dicionário da frota (nome -> item) e, em lotes, para o cache de perfis, sem
+    listas intermediárias. None = falha na leitura (mantenha a frota anterior).
+    """
+    fleet: Dict[str, Dict[str, Any]] = {}
+    batch: List[Dict[str, Any]] = []
+    try:
+        for item in iter_instances_from_api():
+            fleet[item["name"]] = item
+            batch.append(item)
+            if len(batch) >= profile_batch:
+                # Perfis (nome/número/foto) para o app não repetir o fetchInstances
+                profiles.store_profiles(batch)
+                batch = []
+    except Exception as e:
+        print(f"[ERRO] Falha ao buscar instâncias na API: {e}")
+        return None
+    profiles.store_profiles(batch)
+    return fleet
+
+
+def main_loop():
+    init_db()
 
-            if not instance or not apikey:
-                print(f"[WARN] Registro inválido vindo da API: instance='{instance}', key presente? {bool(apikey)}")
-                continue
+    if config.OUTBOX_INLINE_WORKER:
+        start_worker_thread()
 
-            # Buscamos SEMPRE o status real do servidor antes de qualquer ação
-            status: Dict[str, Any] = fetch_qr_code_status(instance, apikey)
-            s = status.get('status')
+    if config.SCANNER_METRICS_PORT:
+        metrics.start_http_server(config.SCANNER_METRICS_PORT)
 
-            # 1) Se tem QR, prioriza gerar/enviar link e NÃO tenta deslogar
-            if s == 'qr_code':
-                client_number = instance_number
-                token, link, created = get_or_create_connect_link(instance, apikey, ttl_seconds=4*60*60)
-                if created:
-                    if not client_number:
-                        print(f"[WARN] instance={instance}: 'number' ausente; não é possível enviar o link.")
+    shard = None
+    if config.SCAN_SHARDING:
+        shard = ShardMembership()
+        shard.start()
+
+    scheduler = PollScheduler(fast=config.SCAN_WEBHOOK_RECONCILE if config.WEBHOOK_MODE else None)
+    last_event_id = instance_state.latest_event_id() if config.WEBHOOK_MODE else None
+    snapshot = FleetSnapshot()
+    # Warm restart: retoma estados e vencimentos gravados pela execução anterior
+    warm_due: Optional[Dict[str, float]] = None
+    if config.SCAN_STATE_SAVE_INTERVAL > 0:
+        restored = snapshot.load()
+        if restored:
+            print(f"[INFO] Estado de {restored} instância(s) restaurado do Redis; retomando sem varredura completa.")
+            warm_due = {}
+    next_state_save = time.monotonic() + config.SCAN_STATE_SAVE_INTERVAL
+    all_instances: Dict[str, Dict[str, Any]] = {}
+    fleet: Dict[str, Dict[str, Any]] = {}   # instâncias sob responsabilidade desta réplica
+    shard_version = -1
+    next_refresh = 0.0
+    max_sleep = min(config.SCAN_FLEET_REFRESH, config.SCAN_SHARD_HEARTBEAT) if shard else config.SCAN_FLEET_REFRESH
+
+    try:
+        with ThreadPoolExecutor(max_workers=config.SCAN_CONCURRENCY, thread_name_prefix="scan") as executor:
+            while True:
+                now = time.monotonic()
+
+                # Relê a frota periodicamente (novas instâncias entram vencidas no agendador)
+                refreshed = now >= next_refresh
+                if refreshed:
+                    with metrics.SWEEP_PHASE_SECONDS.time(phase="fetch_instances"):
+                        fetched = fetch_fleet()
+                    # Falha do upstream (ou breaker aberto) não é frota vazia:
+                    # mantém a frota anterior e não apaga os links como órfãos
+                    upstream_failed = fetched is None
+                    if upstream_failed:
+                        print(f"[WARN] fetchInstances indisponível; mantendo a frota anterior ({len(all_instances)} instâncias).")
                     else:
-                        ok, resp = send_text_admin_to_client(client_number, link)
-                        if ok:
-                            print(f"[OK] Link enviado p/ {client_number} (instance={instance})")
-                        else:
-                            print(f"[ERRO] Envio p/ {client_number} (instance={instance}) -> {resp}")
-                else:
-                    print(f"[INFO] instance={instance}: link já existe/recente; nada a enviar agora.")
-                # Próxima instância
-                continue
-
-            # 2) Se está conectado, aí sim verificamos divergência de número e eventualmente deslogamos
-            if s == 'connected' or conn_status_hint in ('open', 'connected'):
-                if owner_jid_number and instance_number and owner_jid_number != instance_number:
-                    print(f"[WARN] instance={instance}: divergência (ownerJid={owner_jid_number} != cadastro={instance_number}). Efetuando logout...")
-                    ok, resp = logout_instance(instance, apikey)
-                    if ok:
-                        print(f"[OK] instance={instance}: logout realizado. Detalhe: {resp}")
-                        get_or_create_connect_link(instance, apikey, ttl_seconds=4*60*60)
+                        all_instances = fetched
+                        if not all_instances:
+                            print("[INFO] Nenhuma instância retornada pela API. Aguardando...")
+
+                    # 🧹 limpeza de links órfãos (no modo fragmentado, só a réplica líder)
+                    if not upstream_failed and (shard is None or shard.is_leader()):
+                        with metrics.SWEEP_PHASE_SECONDS.time(phase="cleanup"):
+                            cleanup_orphan_links(all_instances)
+
+                    next_refresh = now + config.SCAN_FLEET_REFRESH
+
+                # Recalcula a fatia desta réplica quando a frota ou os membros mudam
+                if refreshed or (shard is not None and shard.version != shard_version):
+                    if shard is not None:
+                        shard_version = shard.version
+                        fleet = {name: item for name, item in all_instances.items() if shard.owns(name)}
                     else:
-                        print(f"[ERRO] instance={instance}: falha no logout -> {resp}")
-                else:
-                    print(f"[OK] instance={instance}: conectada e sem divergência.")
-                continue
-
-            # 3) Demais casos (não conectado): só aguardamos/otimizamos o polling
-            if s == 'unknown':
-                print(f"[INFO] instance={instance}: status desconhecido -> {status.get('raw')}")
-            elif s == 'error':
-                print(f"[ERRO] instance={instance}: {status.get('message')}")
-            else:
-                # ex.: estado 'close' ou sem estado definido
-                if conn_status_hint == 'connecting':
-                    print(f"[INFO] instance={instance}: connecting, aguardando QR...")
-                    next_sleep = min(next_sleep, 15)  # acelera a próxima varredura
-                else:
-                    print(f"[INFO] instance={instance}: não conectada (hint='{conn_status_hint}').")
-
-        sleep(next_sleep)
\ No newline at end of file
+                        fleet = all_instances
+
+                    if warm_due is not None:
+                        warm_due = snapshot.due_times(fleet)
+                    scheduler.sync(fleet, now, due=warm_due)
+                    warm_due = None
+                    snapshot.forget_missing(fleet, all_instances)
+                    # Mudou status/ownerJid/número desde a última checagem -> consulta já
+                    for name in snapshot.changed(fleet):
+                        scheduler.touch(name, now)
+
+                due = [fleet[name] for name in scheduler.pop_due(now) if name in fleet]
+                if due:
+                    # Conectadas e inalteradas: sem chamada ao upstream, só reagenda
+                    to_check = [item for item in due if snapshot.needs_check(item, now)]
+                    skipped = len(due) - len(to_check)
+                    if skipped:
+                        checked = {item["name"] for item in to_check}
+                        for item in due:
+                            if item["name"] not in checked:
+                                snapshot.reschedule(item["name"], now + scheduler.schedule(item["name"], "connected", now))
+
+                    started = time.monotonic()
+                    results = run_sweep(to_check, executor, snapshot)
+                    finished = time.monotonic()
+                    metrics.SWEEP_PHASE_SECONDS.observe(finished - started, phase="sweep")
+                    connected_now = []
+                    for item, res in zip(to_check, results):
+                        if res.get("instance"):
+                            interval = scheduler.schedule(res["instance"], res["state"], finished)
+                            previous = snapshot.record(item, res["state"], finished, res.get("qr_hash"), finished + interval)
+                            if res["state"] == "connected" and previous not in ("", "connected"):
+                                connected_now.append(res["instance"])
+                    # Acabaram de conectar: descarta o perfil gravado (pode ser de outro aparelho)
+                    profiles.invalidate(connected_now)
+
+                    st = scheduler.stats(finished)
+                    metrics.SCHEDULER_DEPTH.set(st["depth"])
+                    metrics.SCHEDULER_LAG.set(st["pop_lag"])
+                    metrics.INSTANCES.replace({(state,): n for state, n in snapshot.state_counts().items()})
+                    print(
+                        f"[SWEEP] {len(to_check)}/{len(fleet)} instâncias em {finished - started:.2f}s "
+                        f"(inalteradas puladas={skipped}, "
+                        f"concorrência={config.SCAN_CONCURRENCY}, fila={st['depth']}, "
+                        f"vencidas={st['due']}, atraso={st['pop_lag']:.1f}s)."
+                    )
+
+                if config.SCAN_STATE_SAVE_INTERVAL > 0 and time.monotonic() >= next_state_save:
+                    snapshot.save()
+                    next_state_save = time.monotonic() + config.SCAN_STATE_SAVE_INTERVAL
+
+                # Dorme até a próxima instância vencer ou a próxima releitura da frota
+                wake = next_refresh
+                nd = scheduler.next_due()
+                if nd is not None:
+                    wake = min(wake, nd)
+                wait = min(max(wake - time.monotonic(), 0.5), max_sleep)
+
+                if last_event_id is None:
+                    sleep(wait)
+                    continue
+
+                # Modo webhook: a espera é um XREAD bloqueante; um evento acorda o loop
+                try:
+                    last_event_id, events = instance_state.read_events(last_event_id, block_ms=int(wait * 1000))
+                except Exception as e:
+                    print(f"[WARN] Falha ao ler eventos de webhook: {e}")
+                    sleep(wait)
+                    continue
+                now = time.monotonic()
+                for ev in events:
+                    if ev.get("instance") in fleet:
+                        snapshot.invalidate(ev["instance"])
+                        scheduler.touch(ev["instance"], now)
+    finally:
+        if config.SCAN_STATE_SAVE_INTERVAL > 0:
+            snapshot.save()
+        # Sai do grupo para as outras réplicas assumirem a fatia imediatamente
+        if shard is not None:
+            shard.leave()
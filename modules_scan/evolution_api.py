@@ -4,14 +4,95 @@ Chamadas à Evolution Global API (instâncias, QR/status, logout).
 Não altera a estrutura do algoritmo original.
 """
 
+import io
 import json
-import requests
-from typing import List, Dict, Any, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-from . import config
+from . import config, http_client
 from .utils import build_url
 
 
+def _normalize_instance(it: Any) -> Optional[Dict[str, Any]]:
+    it = it or {}
+    name = it.get("name") or ""
+    token = it.get("token") or ""
+    number = it.get("number") or ""       # número do cadastro
+    cstatus = it.get("connectionStatus") or ""
+    owner_jid = it.get("ownerJid") or ""  # jid do aparelho logado
+
+    if not name or not token:
+        return None
+
+    return {
+        "name": name,
+        "key": token,
+        "customer_number": number,
+        "instance_number": number,
+        "owner_jid": owner_jid,
+        "connection_status": str(cstatus).lower(),
+        "profile_name": it.get("profileName") or "",
+        "profile_pic_url": it.get("profilePicUrl") or "",
+    }
+
+
+def _raw_instances(resp) -> Iterator[Any]:
+    """
+    Registros crus do corpo do fetchInstances. Com ijson instalado e corpo em
+    lista (formato atual da Evolution), lê do socket item a item, sem montar
+    o JSON inteiro em memória; senão cai no resp.json() de sempre.
+    """
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+
+    if ijson is not None:
+        resp.raw.decode_content = True  # gzip/deflate descomprimidos na leitura
+        resp.raw.auto_close = False     # o BufferedReader ainda lê após o fim do corpo
+        body = io.BufferedReader(resp.raw, buffer_size=64 * 1024)
+        if body.peek(1).lstrip()[:1] == b"[":
+            yield from ijson.items(body, "item", use_float=True)
+            return
+        data = json.load(body)
+    else:
+        data = resp.json()
+
+    if isinstance(data, dict):
+        raw_list = data.get("instances")
+        if isinstance(raw_list, list):
+            instances = raw_list
+        else:
+            instances = list(data.values())[0] if data.values() else []
+    elif isinstance(data, list):
+        instances = data
+    else:
+        instances = []
+    yield from instances or []
+
+
+def iter_instances_from_api() -> Iterator[Dict[str, Any]]:
+    """
+    Lê as instâncias via Evolution Global API, entregando cada uma já normalizada
+    (formato de fetch_instances_from_api) à medida que o corpo chega.
+    Falhas (HTTP, rede, JSON truncado) são levantadas para o chamador, que
+    não deve tratar uma lista parcial como a frota inteira.
+    """
+    if not config.API_KEY:
+        raise RuntimeError("EVOLUTION_GLOBAL_KEY não configurada.")
+
+    url = build_url("/instance/fetchInstances")
+    headers = {"apikey": config.API_KEY}
+    resp = http_client.get("fetch_instances", url, headers=headers, stream=True)
+    try:
+        resp.raise_for_status()
+        for it in _raw_instances(resp):
+            item = _normalize_instance(it)
+            if item is not None:
+                yield item
+    finally:
+        resp.close()
+
+
 def fetch_instances_from_api() -> List[Dict[str, Any]]:
     """
     Lê todas as instâncias via Evolution Global API e normaliza para:
@@ -21,56 +102,14 @@ def fetch_instances_from_api() -> List[Dict[str, Any]]:
         "customer_number": "<numero_cadastrado>",
         "instance_number": "<numero_cadastrado>",
         "owner_jid": "<ownerJid>",
-        "connection_status": "<open|close|...>"
+        "connection_status": "<open|close|...>",
+        "profile_name": "<profileName>",
+        "profile_pic_url": "<profilePicUrl>"
       }
+    Mesmo comportamento de iter_instances_from_api (falhas são levantadas:
+    lista vazia aqui significa frota vazia, não erro).
     """
-    if not config.API_KEY:
-        print("[ERRO] EVOLUTION_GLOBAL_KEY não configurada.")
-        return []
-
-    try:
-        url = build_url("/instance/fetchInstances")
-        headers = {"apikey": config.API_KEY}
-        resp = requests.get(url, headers=headers, verify=False, timeout=20)
-        resp.raise_for_status()
-        data = resp.json()
-
-        if isinstance(data, dict):
-            raw_list = data.get("instances")
-            if isinstance(raw_list, list):
-                instances = raw_list
-            else:
-                instances = list(data.values())[0] if data.values() else []
-        elif isinstance(data, list):
-            instances = data
-        else:
-            instances = []
-
-        out: List[Dict[str, Any]] = []
-        for it in instances or []:
-            name = (it or {}).get("name") or ""
-            token = (it or {}).get("token") or ""
-            number = (it or {}).get("number") or ""       # número do cadastro
-            cstatus = (it or {}).get("connectionStatus") or ""
-            owner_jid = (it or {}).get("ownerJid") or ""  # jid do aparelho logado
-
-            if not name or not token:
-                continue
-
-            out.append({
-                "name": name,
-                "key": token,
-                "customer_number": number,
-                "instance_number": number,
-                "owner_jid": owner_jid,
-                "connection_status": str(cstatus).lower()
-            })
-
-        return out
-
-    except Exception as e:
-        print(f"[ERRO] Falha ao buscar instâncias na API: {e}")
-        return []
+    return list(iter_instances_from_api())
 
 
 def fetch_qr_code_status(instanceName: str, apikey: str) -> Dict[str, Any]:
@@ -83,7 +122,7 @@ def fetch_qr_code_status(instanceName: str, apikey: str) -> Dict[str, Any]:
     try:
         url = build_url(f"/instance/connect/{instanceName}")
         headers = {"apikey": apikey}
-        rqs = requests.get(url, headers=headers, verify=False, timeout=10)
+        rqs = http_client.get("connect", url, headers=headers)
         data = rqs.json()
 
         code = data.get("code")
@@ -109,7 +148,7 @@ def logout_instance(instance: str, apikey: str) -> Tuple[bool, Dict[str, Any]]:
     try:
         url = build_url(f"/instance/logout/{instance}")
         headers = {"apikey": apikey}
-        r = requests.delete(url, headers=headers, verify=False, timeout=15)
+        r = http_client.delete("logout", url, headers=headers)
         r.raise_for_status()
         try:
             return True, r.json()
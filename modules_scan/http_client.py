@@ -0,0 +1,208 @@
+# modulo/http_client.py
+"""
+Cliente HTTP compartilhado (scanner e app) para a Evolution API.
+
+Usa uma única requests.Session com pool de conexões e keep-alive, evitando um
+novo handshake TCP+TLS a cada chamada para o mesmo EVOLUTION_DOMAIN.
+Cada chamada informa o "endpoint" lógico, que define o timeout padrão, o
+circuit breaker usado (breaker.py) e se pode haver retry dentro do orçamento.
+
+O app usa a variante assíncrona (aget/apost/astream) sobre um httpx.AsyncClient
+com o mesmo pool/timeouts, um por event loop. requests e httpx só são
+importados no primeiro uso: o app não carrega requests, o scanner não carrega httpx.
+"""
+
+import asyncio
+import threading
+import weakref
+from typing import TYPE_CHECKING, Optional
+
+from . import breaker, config, metrics
+from .breaker import CircuitOpenError  # noqa: F401  (reexportado para os chamadores)
+
+if TYPE_CHECKING:
+    import requests
+
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> "requests.Session":
+    import requests
+    import urllib3
+    from requests.adapters import HTTPAdapter
+
+    # Desabilita warnings de SSL quando verify=False (use HTTPS em produção!)
+    urllib3.disable_warnings()
+
+    s = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=config.HTTP_POOL_SIZE,
+        pool_block=False,
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.verify = False  # mesmo comportamento das chamadas originais (verify=False)
+    return s
+
+
+def get_session() -> "requests.Session":
+    """
+    Retorna a sessão compartilhada (criada sob demanda, thread-safe).
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def timeout_for(endpoint: str) -> float:
+    return config.HTTP_TIMEOUTS.get(endpoint, config.HTTP_TIMEOUT_DEFAULT)
+
+
+# Só métodos idempotentes e falhas rápidas/transitórias são repetidos
+# (timeout não: repetir dobraria a espera que o breaker quer evitar)
+RETRY_METHODS = {"GET", "DELETE"}
+RETRY_STATUSES = {502, 503, 504}
+
+
+def _may_retry(method: str, endpoint: str, attempt: int, b: breaker.CircuitBreaker) -> bool:
+    if method not in RETRY_METHODS or attempt >= config.HTTP_RETRY_MAX or b.state != breaker.CLOSED:
+        return False
+    if not breaker.retry_budget.try_spend():
+        return False
+    metrics.UPSTREAM_RETRIES.inc(endpoint=endpoint)
+    return True
+
+
+def request(method: str, endpoint: str, url: str, **kwargs) -> "requests.Response":
+    """
+    Executa a requisição pela sessão compartilhada.
+    `endpoint` é o nome lógico (ex.: "connect", "logout") usado para o timeout
+    e para o circuit breaker; com o breaker aberto levanta CircuitOpenError.
+    """
+    import requests
+
+    kwargs.setdefault("timeout", timeout_for(endpoint))
+    b = breaker.get_breaker(endpoint)
+    breaker.retry_budget.deposit()
+    attempt = 0
+    while True:
+        b.before_call()
+        with metrics.UPSTREAM_SECONDS.time(endpoint=endpoint):
+            try:
+                resp = get_session().request(method, url, **kwargs)
+            except requests.RequestException as e:
+                metrics.UPSTREAM_ERRORS.inc(endpoint=endpoint)
+                b.record(False, type(e).__name__)
+                transient = isinstance(e, requests.ConnectionError) and not isinstance(e, requests.Timeout)
+                if transient and _may_retry(method, endpoint, attempt, b):
+                    attempt += 1
+                    continue
+                raise
+            except BaseException:
+                # Erro fora do transporte (ex.: ValueError no preparo da requisição):
+                # sem veredito sobre o upstream, só libera a vaga de sonda do half-open
+                b.release_probe()
+                raise
+        b.record(resp.status_code < 500, f"HTTP {resp.status_code}")
+        if resp.status_code in RETRY_STATUSES and _may_retry(method, endpoint, attempt, b):
+            resp.close()
+            attempt += 1
+            continue
+        return resp
+
+
+def get(endpoint: str, url: str, **kwargs) -> "requests.Response":
+    return request("GET", endpoint, url, **kwargs)
+
+
+def post(endpoint: str, url: str, **kwargs) -> "requests.Response":
+    return request("POST", endpoint, url, **kwargs)
+
+
+def delete(endpoint: str, url: str, **kwargs) -> "requests.Response":
+    return request("DELETE", endpoint, url, **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Variante assíncrona (httpx)
+# ---------------------------------------------------------------------------
+
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """
+    httpx.AsyncClient do event loop atual (criado sob demanda).
+    """
+    import httpx  # só o app precisa; o scanner não paga o import
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            verify=False,
+            follow_redirects=True,  # mesmo comportamento do requests
+            timeout=config.HTTP_TIMEOUT_DEFAULT,
+            limits=httpx.Limits(
+                max_connections=config.HTTP_POOL_SIZE,
+                max_keepalive_connections=config.HTTP_POOL_SIZE,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def arequest(method: str, endpoint: str, url: str, stream: bool = False, **kwargs):
+    """
+    Equivalente async de request(). Com stream=True o corpo não é lido;
+    o chamador deve fechar a resposta (await resp.aclose()).
+    """
+    import httpx
+
+    kwargs.setdefault("timeout", timeout_for(endpoint))
+    client = get_async_client()
+    b = breaker.get_breaker(endpoint)
+    breaker.retry_budget.deposit()
+    attempt = 0
+    while True:
+        b.before_call()
+        with metrics.UPSTREAM_SECONDS.time(endpoint=endpoint):
+            try:
+                req = client.build_request(method, url, **kwargs)
+                resp = await client.send(req, stream=stream)
+            except httpx.HTTPError as e:
+                metrics.UPSTREAM_ERRORS.inc(endpoint=endpoint)
+                b.record(False, type(e).__name__)
+                if isinstance(e, httpx.ConnectError) and _may_retry(method, endpoint, attempt, b):
+                    attempt += 1
+                    continue
+                raise
+            except BaseException:
+                # Cancelamento ou erro fora do transporte: sem veredito, libera a sonda
+                b.release_probe()
+                raise
+        b.record(resp.status_code < 500, f"HTTP {resp.status_code}")
+        if resp.status_code in RETRY_STATUSES and _may_retry(method, endpoint, attempt, b):
+            await resp.aclose()
+            attempt += 1
+            continue
+        return resp
+
+
+async def aget(endpoint: str, url: str, **kwargs):
+    return await arequest("GET", endpoint, url, **kwargs)
+
+
+async def apost(endpoint: str, url: str, **kwargs):
+    return await arequest("POST", endpoint, url, **kwargs)
+
+
+async def aclose_async_client():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
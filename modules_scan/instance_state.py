@@ -0,0 +1,115 @@
+# modulo/instance_state.py
+"""
+Estado por instância recebido por webhook da Evolution (connection.update,
+qrcode.updated), compartilhado entre app e scanner via Redis.
+
+  instance_state:{instance}  HASH   status, qrcode, qr_format, state, updated_at
+                                    (TTL = WEBHOOK_STATE_TTL; expirou -> volta ao polling)
+  instance_events            STREAM um registro por evento (scanner antecipa a instância)
+
+Só ficam gravados os estados que dispensam a consulta a /instance/connect:
+"connected" e "qr_code" com o QR. Os demais (close, connecting, ...) apagam o
+registro: é a própria consulta ao connect que faz a Evolution gerar o QR.
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+
+from . import config, core_links
+
+KEY_EVENTS = "instance_events"
+
+
+def _key_state(instance: str) -> str:
+    return f"instance_state:{instance}"
+
+
+def _cacheable(status: str, qrcode: Optional[str]) -> bool:
+    return status == "connected" or (status == "qr_code" and bool(qrcode))
+
+
+def _queue_record(p, instance: str, status: str, qrcode: Optional[str],
+                  qr_format: Optional[str], state: str):
+    key = _key_state(instance)
+    p.delete(key)
+    if _cacheable(status, qrcode):
+        p.hset(key, mapping={
+            "status": status,
+            "qrcode": qrcode or "",
+            "qr_format": qr_format or "",
+            "state": state or "",
+            "updated_at": str(time.time()),
+        })
+        p.expire(key, config.WEBHOOK_STATE_TTL)
+    p.xadd(KEY_EVENTS, {"instance": instance, "status": status},
+           maxlen=config.WEBHOOK_EVENTS_MAXLEN, approximate=True)
+
+
+def _state_from_hash(h: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    if not h or not _cacheable(h.get("status") or "", h.get("qrcode")):
+        return None
+    return {
+        "qrcode": h.get("qrcode") or None,
+        "qr_format": h.get("qr_format") or None,
+        "status": h["status"],
+    }
+
+
+async def arecord_state(instance: str, status: str, qrcode: Optional[str] = None,
+                        qr_format: Optional[str] = None, state: str = "") -> None:
+    """
+    Grava o estado vindo do webhook (ou apaga o anterior, se o estado não
+    dispensa a consulta) e publica o evento para o scanner.
+    """
+    async with core_links.get_async_redis().pipeline(transaction=False) as p:
+        _queue_record(p, instance, status, qrcode, qr_format, state)
+        await p.execute()
+
+
+def get_state(instance: str) -> Optional[Dict[str, Any]]:
+    """
+    Retorna o estado no mesmo formato de services.fetch_qr_code_status, ou None
+    se não houver estado recente (webhook desativado, sem eventos ou expirado).
+    """
+    if not config.WEBHOOK_MODE:
+        return None
+    try:
+        return _state_from_hash(core_links.get_redis().hgetall(_key_state(instance)))
+    except redis.RedisError:
+        return None
+
+
+async def aget_state(instance: str) -> Optional[Dict[str, Any]]:
+    if not config.WEBHOOK_MODE:
+        return None
+    try:
+        return _state_from_hash(await core_links.get_async_redis().hgetall(_key_state(instance)))
+    except redis.RedisError:
+        return None
+
+
+def latest_event_id() -> str:
+    """
+    Id a partir do qual o scanner passa a ler eventos (ignora o histórico).
+    """
+    try:
+        info = core_links.get_redis().xinfo_stream(KEY_EVENTS)
+        return info.get("last-generated-id") or "0-0"
+    except redis.ResponseError:
+        return "0-0"  # stream ainda não existe
+
+
+def read_events(last_id: str, count: int = 1000, block_ms: Optional[int] = None) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Lê os eventos posteriores a last_id (bloqueando até block_ms, se informado).
+    Retorna (novo_last_id, eventos).
+    """
+    resp = core_links.get_redis().xread({KEY_EVENTS: last_id}, count=count, block=block_ms)
+    events: List[Dict[str, str]] = []
+    for _stream, entries in resp or []:
+        for entry_id, fields in entries:
+            last_id = entry_id
+            events.append(fields)
+    return last_id, events
@@ -3,10 +3,9 @@
 Envio de mensagens via instância ADMIN (texto com link).
 """
 
-import requests
 from typing import Tuple, Dict, Any
 
-from . import config
+from . import config, http_client
 from .utils import build_url
 
 
@@ -25,7 +24,7 @@ def send_text_admin_to_client(client_number: str, link: str) -> Tuple[bool, Dict
         "Content-Type": "application/json"
     }
     try:
-        rqs = requests.post(url, json=payload, headers=headers, verify=False, timeout=15)
+        rqs = http_client.post("send_text", url, json=payload, headers=headers)
         rqs.raise_for_status()
         return True, rqs.json()
     except Exception as e:
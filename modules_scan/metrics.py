@@ -0,0 +1,224 @@
+# modulo/metrics.py
+"""
+Métricas em memória no formato texto do Prometheus (sem dependências externas).
+
+Usado pelo scanner (servidor HTTP próprio em SCANNER_METRICS_PORT) e pelo app
+(rota /metrics). Cada processo mantém o seu próprio registro.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_fmt_labels(self.label_names, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def replace(self, values: Dict[LabelKey, float]):
+        """
+        Substitui todas as séries de uma vez (ex.: contagem por estado).
+        """
+        with self._lock:
+            self._values = {tuple(map(str, k)): float(v) for k, v in values.items()}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_fmt_labels(self.label_names, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[LabelKey, List[float]] = {}  # [contagens por bucket..., soma, total]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+                    break
+            s[-2] += value
+            s[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        out = self._header()
+        for key, s in items:
+            acc = 0.0
+            for i, b in enumerate(self.buckets):
+                acc += s[i]
+                out.append(f"{self.name}_bucket{_fmt_labels(self.label_names, key, ('le', _fmt_value(b)))} {_fmt_value(acc)}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.label_names, key)} {_fmt_value(s[-2])}")
+            out.append(f"{self.name}_count{_fmt_labels(self.label_names, key)} {_fmt_value(s[-1])}")
+        return out
+
+
+_registry: List[_Metric] = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines: List[str] = []
+    for m in _registry:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Métricas compartilhadas -------------------------------------------------
+
+UPSTREAM_SECONDS = _register(Histogram(
+    "evolution_upstream_request_seconds", "Latência das chamadas à Evolution API por endpoint.", ("endpoint",)))
+UPSTREAM_ERRORS = _register(Counter(
+    "evolution_upstream_errors_total", "Falhas de transporte nas chamadas à Evolution API.", ("endpoint",)))
+UPSTREAM_BREAKER_STATE = _register(Gauge(
+    "evolution_breaker_state", "Circuit breaker por endpoint (0 = fechado, 1 = half-open, 2 = aberto).", ("endpoint",)))
+UPSTREAM_FAST_FAILS = _register(Counter(
+    "evolution_breaker_rejected_total", "Chamadas recusadas sem ir ao upstream (breaker aberto).", ("endpoint",)))
+UPSTREAM_RETRIES = _register(Counter(
+    "evolution_upstream_retries_total", "Novas tentativas feitas dentro do orçamento de retry.", ("endpoint",)))
+REDIS_SECONDS = _register(Histogram(
+    "redis_command_seconds", "Latência dos comandos Redis (pipelines contam como um).", ("command",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)))
+
+# --- Scanner -----------------------------------------------------------------
+
+SWEEP_PHASE_SECONDS = _register(Histogram(
+    "scanner_phase_seconds",
+    "Duração das fases do scanner (fetch_instances, cleanup, sweep, status, logout).", ("phase",)))
+INSTANCES = _register(Gauge("scanner_instances", "Instâncias desta réplica por último estado observado.", ("state",)))
+SCHEDULER_DEPTH = _register(Gauge("scanner_scheduler_depth", "Instâncias agendadas no scanner."))
+SCHEDULER_LAG = _register(Gauge("scanner_scheduler_lag_seconds", "Atraso da instância mais atrasada no último lote."))
+
+# --- Fila de envio (outbox) --------------------------------------------------
+
+OUTBOX_DEPTH = _register(Gauge(
+    "outbox_queue_depth", "Jobs na fila de envio (links = prontos, retry = aguardando, processing = em envio).",
+    ("queue",)))
+OUTBOX_SEND_SECONDS = _register(Histogram(
+    "outbox_send_seconds", "Duração do envio do link pela instância ADMIN.", ("result",)))
+OUTBOX_QUEUE_SECONDS = _register(Histogram(
+    "outbox_queue_wait_seconds", "Tempo entre o enfileiramento e o envio bem-sucedido do link.",
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 3600.0, 14400.0)))
+
+# --- App ---------------------------------------------------------------------
+
+HTTP_REQUEST_SECONDS = _register(Histogram(
+    "app_http_request_seconds", "Latência das requisições do app por rota.", ("route", "method", "status")))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Expõe /metrics em uma thread daemon (usado pelo scanner).
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,300 @@
+# modulo/outbox.py
+"""
+Fila durável (Redis) para o envio dos links de conexão pela instância ADMIN.
+
+O scanner apenas enfileira (enqueue_link) e segue a varredura; um worker
+separado (thread do scanner ou processo worker.py) consome a fila com:
+  - taxa global configurável (OUTBOX_RATE_PER_SEC, compartilhada entre réplicas)
+  - retry com backoff exponencial (OUTBOX_MAX_ATTEMPTS, OUTBOX_BACKOFF_BASE)
+  - dedupe por instância/token (o mesmo link não é enfileirado duas vezes)
+  - contadores de fila e de latência de envio em outbox:stats, e as métricas
+    outbox_queue_depth / outbox_send_seconds / outbox_queue_wait_seconds
+
+Chaves:
+  outbox:links                 LIST  jobs prontos (LPUSH / BLMOVE pela direita)
+  outbox:retry                 ZSET  jobs aguardando novo envio (score = horário)
+  outbox:processing:{worker}   LIST  jobs em envio por este worker
+  outbox:worker:{worker}       STR   worker vivo (TTL renovado no loop); processing de
+                                     worker sem esta chave volta para a fila
+  outbox:dedupe:{inst}:{tok}   STR   marca de dedupe (TTL = validade do link)
+  outbox:stats                 HASH  contadores
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+import redis
+
+from . import config, core_links, metrics
+from .messaging import send_text_admin_to_client
+
+KEY_QUEUE = "outbox:links"
+KEY_RETRY = "outbox:retry"
+KEY_STATS = "outbox:stats"
+KEY_RATE_SLOT = "outbox:rate:next_slot"
+
+# Intervalo (s) da manutenção do worker (heartbeat, órfãos, métricas de profundidade)
+_MAINTENANCE_INTERVAL = 10.0
+# Sem heartbeat por este tempo (s), o worker é dado como morto e seus jobs em envio voltam à fila
+_WORKER_TTL = 120
+
+
+def _key_processing(worker_id: str) -> str:
+    return f"outbox:processing:{worker_id}"
+
+
+def _key_worker(worker_id: str) -> str:
+    return f"outbox:worker:{worker_id}"
+
+
+def _key_dedupe(instance: str, token: str) -> str:
+    return f"outbox:dedupe:{instance}:{token}"
+
+
+# Reserva atomicamente o próximo "slot" de envio (limite de taxa global).
+# Retorna o horário (ms) em que o chamador pode enviar.
+_RATE_LUA = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local slot = tonumber(redis.call('GET', KEYS[1]) or '0')
+if slot < now then slot = now end
+redis.call('SET', KEYS[1], tostring(slot + interval), 'PX', math.max(1000, interval * 10))
+return slot
+"""
+
+
+def enqueue_link(instance: str, token: str, client_number: str, link: str, ttl_seconds: int = 4*60*60) -> bool:
+    """
+    Enfileira o envio do link. Retorna False se o mesmo instância/token já foi enfileirado.
+    """
+    r = core_links.get_redis()
+    if not r.set(_key_dedupe(instance, token), "1", ex=int(ttl_seconds), nx=True):
+        r.hincrby(KEY_STATS, "deduped", 1)
+        return False
+
+    job = {
+        "instance": instance,
+        "token": token,
+        "number": client_number,
+        "link": link,
+        "attempts": 0,
+        "enqueued_at": time.time(),
+    }
+    with r.pipeline(transaction=False) as p:
+        p.lpush(KEY_QUEUE, json.dumps(job, ensure_ascii=False))
+        p.hincrby(KEY_STATS, "enqueued", 1)
+        p.execute()
+    return True
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Profundidade das filas e contadores de envio.
+    """
+    r = core_links.get_redis()
+    processing_keys = list(r.scan_iter(match=_key_processing("*"), count=1000))
+    with r.pipeline(transaction=False) as p:
+        p.llen(KEY_QUEUE)
+        p.zcard(KEY_RETRY)
+        p.hgetall(KEY_STATS)
+        for key in processing_keys:
+            p.llen(key)
+        queued, retrying, counters, *processing = p.execute()
+
+    counters = {k: int(v) for k, v in (counters or {}).items()}
+    sent = counters.get("sent", 0)
+    return {
+        "queued": queued,
+        "retrying": retrying,
+        "processing": sum(processing),
+        "enqueued": counters.get("enqueued", 0),
+        "deduped": counters.get("deduped", 0),
+        "sent": sent,
+        "retried": counters.get("retried", 0),
+        "failed": counters.get("failed", 0),
+        "avg_send_ms": (counters.get("send_ms_sum", 0) / sent) if sent else 0.0,
+        "avg_queue_ms": (counters.get("queue_ms_sum", 0) / sent) if sent else 0.0,
+    }
+
+
+class OutboxWorker:
+    def __init__(self, worker_id: Optional[str] = None):
+        # Único por processo: o worker embutido no scanner e o worker.py no mesmo host
+        # não podem dividir a lista de processamento (um recuperaria os jobs do outro)
+        self.worker_id = (worker_id or config.OUTBOX_WORKER_ID
+                          or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}")
+        self.key_processing = _key_processing(self.worker_id)
+        self._stop = threading.Event()
+        self._rate = core_links.get_redis().register_script(_RATE_LUA)
+        self._next_maintenance = 0.0
+
+    def stop(self):
+        self._stop.set()
+
+    def _heartbeat(self):
+        core_links.get_redis().set(_key_worker(self.worker_id), "1", ex=_WORKER_TTL)
+
+    def _recover(self):
+        # Jobs que ficaram "em envio" em workers que caíram (sem heartbeat) voltam para a
+        # fila; a própria lista também, caso o id seja fixo (OUTBOX_WORKER_ID)
+        r = core_links.get_redis()
+        prefix = _key_processing("")
+        for key in r.scan_iter(match=_key_processing("*"), count=1000):
+            worker_id = key[len(prefix):]
+            if worker_id != self.worker_id and r.exists(_key_worker(worker_id)):
+                continue
+            n = 0
+            while r.lmove(key, KEY_QUEUE, "RIGHT", "RIGHT"):
+                n += 1
+            if n:
+                print(f"[OUTBOX] {n} envio(s) pendente(s) recuperado(s) ({worker_id}).")
+
+    def _promote_retries(self):
+        r = core_links.get_redis()
+        now = time.time()
+        for raw in r.zrangebyscore(KEY_RETRY, "-inf", now, start=0, num=100):
+            # ZREM garante que só um worker promove cada job
+            if r.zrem(KEY_RETRY, raw):
+                r.lpush(KEY_QUEUE, raw)
+
+    def _wait_rate_slot(self):
+        if config.OUTBOX_RATE_PER_SEC <= 0:
+            return
+        interval_ms = int(1000 / config.OUTBOX_RATE_PER_SEC)
+        slot_ms = int(self._rate(keys=[KEY_RATE_SLOT], args=[int(time.time() * 1000), interval_ms]))
+        delay = slot_ms / 1000.0 - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _retry_or_fail(self, p, job: Dict[str, Any], reason: Any, retry: bool = True):
+        """
+        Agenda nova tentativa com backoff ou, esgotadas as tentativas, conta como falha.
+        """
+        job["attempts"] = int(job.get("attempts", 0)) + 1
+        if retry and job["attempts"] < config.OUTBOX_MAX_ATTEMPTS:
+            delay = min(config.OUTBOX_BACKOFF_MAX, config.OUTBOX_BACKOFF_BASE * (2 ** (job["attempts"] - 1)))
+            p.zadd(KEY_RETRY, {json.dumps(job, ensure_ascii=False): time.time() + delay})
+            p.hincrby(KEY_STATS, "retried", 1)
+            print(f"[WARN] Envio p/ {job.get('number')} (instance={job.get('instance')}) falhou; nova tentativa em {delay:.0f}s -> {reason}")
+        else:
+            p.hincrby(KEY_STATS, "failed", 1)
+            print(f"[ERRO] Envio p/ {job.get('number')} (instance={job.get('instance')}) -> {reason} (desistindo após {job['attempts']} tentativas)")
+
+    def _handle(self, raw: str):
+        r = core_links.get_redis()
+        try:
+            job = json.loads(raw)
+            if not isinstance(job, dict):
+                raise ValueError("job não é um objeto")
+        except ValueError:
+            print(f"[ERRO] Job inválido descartado da fila: {raw!r}")
+            with r.pipeline(transaction=False) as p:
+                p.lrem(self.key_processing, 1, raw)
+                p.hincrby(KEY_STATS, "failed", 1)
+                p.execute()
+            return
+
+        try:
+            self._send(r, raw, job)
+        except Exception as e:
+            self._abandon(r, raw, job, e)
+
+    def _send(self, r, raw: str, job: Dict[str, Any]):
+        self._wait_rate_slot()
+        started = time.time()
+        try:
+            ok, resp = send_text_admin_to_client(job["number"], job["link"])
+        except Exception:
+            metrics.OUTBOX_SEND_SECONDS.observe(time.time() - started, result="error")
+            raise
+        send_s = time.time() - started
+        send_ms = int(send_s * 1000)
+        metrics.OUTBOX_SEND_SECONDS.observe(send_s, result="ok" if ok else "error")
+        if ok:
+            metrics.OUTBOX_QUEUE_SECONDS.observe(max(0.0, started - job.get("enqueued_at", started)))
+
+        with r.pipeline(transaction=False) as p:
+            p.lrem(self.key_processing, 1, raw)
+            if ok:
+                p.hincrby(KEY_STATS, "sent", 1)
+                p.hincrby(KEY_STATS, "send_ms_sum", send_ms)
+                p.hincrby(KEY_STATS, "queue_ms_sum", int((started - job.get("enqueued_at", started)) * 1000))
+                print(f"[OK] Link enviado p/ {job['number']} (instance={job['instance']})")
+            else:
+                self._retry_or_fail(p, job, resp)
+            p.execute()
+
+    def _abandon(self, r, raw: str, job: Dict[str, Any], error: Exception):
+        """
+        Falha inesperada no processamento: tira o job da lista deste worker (senão ele
+        só voltaria no próximo restart) e o reagenda; job malformado é descartado.
+        """
+        malformed = isinstance(error, (KeyError, TypeError, ValueError))
+        try:
+            with r.pipeline(transaction=False) as p:
+                p.lrem(self.key_processing, 1, raw)
+                try:
+                    self._retry_or_fail(p, job, f"{type(error).__name__}: {error}", retry=not malformed)
+                except (TypeError, ValueError):
+                    p.hincrby(KEY_STATS, "failed", 1)
+                    print(f"[ERRO] Job inválido descartado da fila: {raw!r}")
+                p.execute()
+        except redis.RedisError as e:
+            # Fica em outbox:processing e é recuperado por _recover quando este worker parar
+            print(f"[WARN] Outbox: falha ao reagendar job após erro ({error}) -> {e}")
+
+    def _maintain(self):
+        """
+        Heartbeat, recuperação de jobs de workers mortos e gauges de profundidade
+        da fila (no máximo a cada _MAINTENANCE_INTERVAL).
+        """
+        now = time.monotonic()
+        if now < self._next_maintenance:
+            return
+        self._next_maintenance = now + _MAINTENANCE_INTERVAL
+        self._heartbeat()
+        self._recover()
+        st = get_stats()
+        metrics.OUTBOX_DEPTH.set(st["queued"], queue="links")
+        metrics.OUTBOX_DEPTH.set(st["retrying"], queue="retry")
+        metrics.OUTBOX_DEPTH.set(st["processing"], queue="processing")
+
+    def run(self):
+        """
+        Loop do worker (bloqueante).
+        """
+        r = core_links.get_redis()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self._maintain()
+                    self._promote_retries()
+                    raw = r.blmove(KEY_QUEUE, self.key_processing, 1, "RIGHT", "LEFT")
+                    if raw:
+                        self._handle(raw)
+                except redis.RedisError as e:
+                    print(f"[WARN] Outbox: erro de Redis -> {e}")
+                    time.sleep(1)
+                except Exception as e:
+                    print(f"[ERRO] Outbox: falha inesperada -> {e}")
+                    time.sleep(1)
+        finally:
+            # Parada limpa: o que ainda estiver em envio pode ser recuperado já pelos outros
+            try:
+                r.delete(_key_worker(self.worker_id))
+            except redis.RedisError:
+                pass
+
+
+def start_worker_thread() -> OutboxWorker:
+    """
+    Sobe o worker em uma thread daemon (modo embutido no scanner).
+    """
+    worker = OutboxWorker()
+    threading.Thread(target=worker.run, name="outbox-worker", daemon=True).start()
+    return worker
@@ -0,0 +1,119 @@
+# modulo/profiles.py
+"""
+Perfil do WhatsApp por instância (nome, número, URL da foto), compartilhado
+entre scanner e app via Redis:
+
+  instance_profile:{instance}  HASH  profileName, name, number, profilePicUrl
+                                     (TTL = PROFILE_CACHE_TTL)
+
+O scanner grava a cada leitura do fetchInstances, só para instâncias conectadas
+(antes disso o fetchInstances não traz nome nem foto do WhatsApp); as demais têm o
+registro apagado, assim como a instância que acaba de conectar. O app lê daqui e
+só consulta a Evolution quando não há registro com perfil de fato (e então grava
+o que obteve).
+"""
+
+from typing import Any, Dict, Iterable, Optional
+
+import redis
+
+from . import config, core_links
+
+_FIELDS = ("profileName", "name", "number", "profilePicUrl")
+
+
+def _key_profile(instance: str) -> str:
+    return f"instance_profile:{instance}"
+
+
+def _queue_store(p, instance: str, profile: Dict[str, Any]):
+    key = _key_profile(instance)
+    p.hset(key, mapping={f: profile.get(f) or "" for f in _FIELDS})
+    p.expire(key, config.PROFILE_CACHE_TTL)
+
+
+def has_profile(instance: str, profile: Dict[str, Any]) -> bool:
+    """
+    True se há nome do WhatsApp ou foto (o nome da instância não conta como perfil).
+    """
+    name = profile.get("profileName")
+    return bool(profile.get("profilePicUrl")) or bool(name and name != instance)
+
+
+def _profile_from_hash(instance: str, h: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    if not h:
+        return None
+    profile = {f: h.get(f) or None for f in _FIELDS}
+    return profile if has_profile(instance, profile) else None
+
+
+def profile_from_instance(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Perfil a partir de um item normalizado por fetch_instances_from_api.
+    """
+    name = item.get("profile_name") or item.get("name")
+    return {
+        "profileName": name,
+        "name": name,
+        "number": item.get("instance_number") or item.get("customer_number"),
+        "profilePicUrl": item.get("profile_pic_url") or None,
+    }
+
+
+def store_profiles(instances: Iterable[Dict[str, Any]], batch: int = 500) -> None:
+    """
+    Grava o perfil de cada instância conectada lida do fetchInstances e apaga o
+    das demais (em pipelines).
+    """
+    try:
+        for chunk in core_links._chunks(instances, batch):
+            with core_links.get_redis().pipeline(transaction=False) as p:
+                for item in chunk:
+                    if not item.get("name"):
+                        continue
+                    if (item.get("connection_status") or "").lower() == "open":
+                        _queue_store(p, item["name"], profile_from_instance(item))
+                    else:
+                        p.delete(_key_profile(item["name"]))
+                p.execute()
+    except redis.RedisError as e:
+        print(f"[WARN] Falha ao gravar perfis no Redis: {e}")
+
+
+def invalidate(instances: Iterable[str]) -> None:
+    """
+    Apaga o registro das instâncias que acabaram de conectar (o perfil pode ser de outro aparelho).
+    """
+    keys = [_key_profile(name) for name in instances]
+    if not keys:
+        return
+    try:
+        core_links.get_redis().delete(*keys)
+    except redis.RedisError as e:
+        print(f"[WARN] Falha ao invalidar perfis no Redis: {e}")
+
+
+async def ainvalidate(instance: str) -> None:
+    try:
+        await core_links.get_async_redis().delete(_key_profile(instance))
+    except redis.RedisError:
+        pass
+
+
+async def aget_profile(instance: str) -> Optional[Dict[str, Any]]:
+    """
+    Perfil gravado da instância, ou None (sem registro ou registro sem nome/foto).
+    """
+    try:
+        return _profile_from_hash(instance, await core_links.get_async_redis().hgetall(_key_profile(instance)))
+    except redis.RedisError:
+        return None
+
+
+async def astore_profile(instance: str, profile: Dict[str, Any]) -> None:
+    try:
+        async with core_links.get_async_redis().pipeline(transaction=False) as p:
+            _queue_store(p, instance, profile)
+            await p.execute()
+    except redis.RedisError:
+        pass
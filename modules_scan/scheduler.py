@@ -0,0 +1,138 @@
+# modulo/scheduler.py
+"""
+Agendador de polling por instância.
+
+Cada instância tem o seu próprio "próximo horário" (heap de vencimentos):
+  - qr_code / connecting -> intervalo curto (SCAN_POLL_FAST)
+  - connected            -> intervalo longo (SCAN_POLL_SLOW)
+  - error / unknown      -> backoff exponencial (SCAN_BACKOFF_BASE .. SCAN_BACKOFF_MAX)
+  - demais estados       -> intervalo padrão (SCAN_POLL_IDLE)
+Assim a carga no upstream cresce com a rotatividade, não com o tamanho da frota.
+"""
+
+import heapq
+import itertools
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import config
+
+
+class PollScheduler:
+    def __init__(
+        self,
+        fast: float = None,
+        slow: float = None,
+        idle: float = None,
+        backoff_base: float = None,
+        backoff_max: float = None,
+    ):
+        self.fast = config.SCAN_POLL_FAST if fast is None else fast
+        self.slow = config.SCAN_POLL_SLOW if slow is None else slow
+        self.idle = config.SCAN_POLL_IDLE if idle is None else idle
+        self.backoff_base = config.SCAN_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = config.SCAN_BACKOFF_MAX if backoff_max is None else backoff_max
+
+        self._heap: List[Tuple[float, int, str]] = []
+        self._due: Dict[str, float] = {}      # vencimento vigente por instância
+        self._failures: Dict[str, int] = {}   # falhas consecutivas (error/unknown)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.last_pop_lag = 0.0  # atraso da instância mais atrasada no último pop_due()
+
+    def _push(self, name: str, due: float):
+        # Entradas antigas no heap são descartadas de forma preguiçosa em pop_due()
+        self._due[name] = due
+        heapq.heappush(self._heap, (due, next(self._seq), name))
+
+    def sync(self, names: Iterable[str], now: float, due: Optional[Dict[str, float]] = None):
+        """
+        Alinha o agendador com a lista atual de instâncias:
+        novas entram vencidas (agora), ou no vencimento informado em `due`
+        (ex.: restaurado de uma execução anterior); ausentes são removidas.
+        """
+        names = set(names)
+        with self._lock:
+            for gone in set(self._due) - names:
+                del self._due[gone]
+                self._failures.pop(gone, None)
+            for name in names:
+                if name not in self._due:
+                    self._push(name, max(now, due.get(name, now)) if due else now)
+            # Compacta o heap se acumulou muitas entradas obsoletas
+            if len(self._heap) > 2 * len(self._due) + 64:
+                self._heap = [(d, s, n) for d, s, n in self._heap if self._due.get(n) == d]
+                heapq.heapify(self._heap)
+
+    def touch(self, name: str, now: float):
+        """
+        Antecipa a instância para agora (ex.: mudança detectada fora do polling).
+        """
+        with self._lock:
+            due = self._due.get(name)
+            if due is not None and now < due != float("inf"):
+                self._push(name, now)
+
+    def pop_due(self, now: float) -> List[str]:
+        """
+        Retira e retorna as instâncias vencidas. Elas só voltam ao heap via schedule().
+        """
+        out: List[str] = []
+        lag = 0.0
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, _, name = heapq.heappop(self._heap)
+                if self._due.get(name) != due:
+                    continue  # entrada obsoleta
+                self._due[name] = float("inf")  # em processamento
+                lag = max(lag, now - due)
+                out.append(name)
+            if out:
+                self.last_pop_lag = lag
+        return out
+
+    def interval_for(self, name: str, state: str) -> float:
+        if state in ("qr_code", "connecting"):
+            self._failures.pop(name, None)
+            return self.fast
+        if state == "connected":
+            self._failures.pop(name, None)
+            return self.slow
+        if state in ("error", "unknown"):
+            n = self._failures.get(name, 0)
+            self._failures[name] = n + 1
+            return min(self.backoff_max, self.backoff_base * (2 ** n))
+        self._failures.pop(name, None)
+        return self.idle
+
+    def schedule(self, name: str, state: str, now: float) -> float:
+        """
+        Reagenda a instância conforme o estado observado. Retorna o intervalo usado.
+        """
+        with self._lock:
+            if name not in self._due:
+                return 0.0  # instância saiu da frota durante o processamento
+            interval = self.interval_for(name, state)
+            self._push(name, now + interval)
+            return interval
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def stats(self, now: float) -> Dict[str, float]:
+        """
+        depth: instâncias agendadas; due: já vencidas; lag: atraso da mais antiga vencida (s);
+        pop_lag: atraso máximo observado no último lote retirado.
+        """
+        with self._lock:
+            pending = [d for d in self._due.values() if d != float("inf")]
+        overdue = [now - d for d in pending if d <= now]
+        return {
+            "depth": len(pending),
+            "due": len(overdue),
+            "lag": max(overdue) if overdue else 0.0,
+            "pop_lag": self.last_pop_lag,
+        }
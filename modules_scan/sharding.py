@@ -0,0 +1,109 @@
+# modulo/sharding.py
+"""
+Modo fragmentado do scanner: várias réplicas dividem as instâncias entre si.
+
+Cada réplica renova um lease em scanner:members (ZSET, score = último heartbeat).
+Réplicas sem heartbeat há mais de SCAN_SHARD_LEASE segundos são removidas por
+qualquer outra, e o anel de hash consistente (com nós virtuais) é recalculado:
+só as instâncias da réplica que caiu mudam de dono.
+A réplica de menor id é a "líder" e é a única que roda a limpeza de órfãos.
+"""
+
+import bisect
+import hashlib
+import os
+import socket
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import redis
+
+from . import config, core_links
+
+KEY_MEMBERS = "scanner:members"
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, members: List[str], vnodes: int):
+        points: List[Tuple[int, str]] = []
+        for m in members:
+            for v in range(vnodes):
+                points.append((_hash(f"{m}#{v}"), m))
+        points.sort()
+        self._keys = [p[0] for p in points]
+        self._owners = [p[1] for p in points]
+
+    def owner(self, name: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(name)) % len(self._keys)
+        return self._owners[i]
+
+
+class ShardMembership:
+    def __init__(self, replica_id: Optional[str] = None):
+        self.replica_id = replica_id or config.SCAN_REPLICA_ID or f"{socket.gethostname()}:{os.getpid()}"
+        self.members: List[str] = []
+        self.version = 0  # incrementa a cada mudança de membros (rebalanceamento)
+        self._ring = HashRing([], config.SCAN_SHARD_VNODES)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def heartbeat(self):
+        """
+        Renova o lease desta réplica, remove réplicas expiradas e atualiza o anel.
+        """
+        r = core_links.get_redis()
+        now = time.time()
+        with r.pipeline(transaction=True) as p:
+            p.zadd(KEY_MEMBERS, {self.replica_id: now})
+            p.zremrangebyscore(KEY_MEMBERS, "-inf", now - config.SCAN_SHARD_LEASE)
+            p.zrange(KEY_MEMBERS, 0, -1)
+            members = sorted(p.execute()[2])
+
+        with self._lock:
+            if members != self.members:
+                self.members = members
+                self._ring = HashRing(members, config.SCAN_SHARD_VNODES)
+                self.version += 1
+                print(f"[SHARD] {self.replica_id}: membros = {members}")
+
+    def owns(self, name: str) -> bool:
+        with self._lock:
+            owner = self._ring.owner(name)
+        # Sem membros conhecidos (Redis fora): processa tudo para não parar o serviço
+        return owner is None or owner == self.replica_id
+
+    def is_leader(self) -> bool:
+        with self._lock:
+            return not self.members or self.members[0] == self.replica_id
+
+    def _safe_heartbeat(self):
+        try:
+            self.heartbeat()
+        except redis.RedisError as e:
+            print(f"[WARN] {self.replica_id}: falha no heartbeat do shard -> {e}")
+
+    def _run(self):
+        while not self._stop.wait(config.SCAN_SHARD_HEARTBEAT):
+            self._safe_heartbeat()
+
+    def start(self):
+        """
+        Entra no grupo e mantém o lease em uma thread daemon. Com o Redis fora no
+        boot, começa com o anel vazio (processa tudo) até o próximo heartbeat.
+        """
+        self._safe_heartbeat()
+        threading.Thread(target=self._run, name="shard-heartbeat", daemon=True).start()
+
+    def leave(self):
+        self._stop.set()
+        try:
+            core_links.get_redis().zrem(KEY_MEMBERS, self.replica_id)
+        except redis.RedisError:
+            pass
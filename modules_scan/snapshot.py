@@ -0,0 +1,261 @@
+# modulo/snapshot.py
+"""
+Tabela de estado por instância mantida entre varreduras (e entre reinícios).
+
+Permite pular a chamada /instance/connect/{name} para instâncias conectadas
+cujo connectionStatus, ownerJid e número não mudaram desde a última checagem.
+Instâncias alteradas, em QR ou em connecting continuam sendo consultadas.
+
+Cada instância é um InstanceRecord (__slots__) com a fingerprint da última
+checagem, os números já normalizados, o último estado, o hash do último QR e o
+próximo vencimento. A tabela é gravada periodicamente no Redis para que um
+scanner reiniciado retome de onde parou em vez de reconsultar a frota inteira:
+
+  scanner_state  HASH  {instance} -> JSON [versão, status, ownerJid, número,
+                                           estado, hash do QR, checado em, próximo]
+                       (horários em epoch; TTL = SCAN_STATE_TTL)
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import redis
+
+from . import config, core_links
+from .utils import normalize_number, number_from_owner_jid
+
+Fingerprint = Tuple[str, str, str]
+
+KEY_STATE = "scanner_state"
+_STATE_VERSION = 1
+
+
+def fingerprint(item: Dict[str, Any]) -> Fingerprint:
+    return (
+        (item.get("connection_status") or "").lower(),
+        item.get("owner_jid") or "",
+        item.get("instance_number") or item.get("customer_number") or "",
+    )
+
+
+class InstanceRecord:
+    __slots__ = ("status", "owner_jid", "number", "instance_number", "owner_number",
+                 "state", "qr_hash", "checked_at", "next_due")
+
+    def __init__(self, status: str = "", owner_jid: str = "", number: str = ""):
+        self.status = status          # connectionStatus na última checagem
+        self.owner_jid = owner_jid
+        self.number = number          # número cadastrado (bruto)
+        self.instance_number = normalize_number(number)
+        self.owner_number = normalize_number(number_from_owner_jid(owner_jid))
+        self.state = ""               # estado efetivo na última checagem ("" = nunca checada)
+        self.qr_hash = ""
+        self.checked_at = 0.0         # time.monotonic()
+        self.next_due = 0.0           # time.monotonic(); 0 = sem agendamento conhecido
+
+    @property
+    def fingerprint(self) -> Fingerprint:
+        return self.status, self.owner_jid, self.number
+
+    def set_fingerprint(self, fp: Fingerprint):
+        status, owner_jid, number = fp
+        # As expressões regulares só rodam quando o valor bruto muda
+        if number != self.number:
+            self.instance_number = normalize_number(number)
+        if owner_jid != self.owner_jid:
+            self.owner_number = normalize_number(number_from_owner_jid(owner_jid))
+        self.status, self.owner_jid, self.number = status, owner_jid, number
+
+    def dump(self, offset: float) -> str:
+        return json.dumps([
+            _STATE_VERSION, self.status, self.owner_jid, self.number, self.state, self.qr_hash,
+            round(self.checked_at + offset, 1) if self.checked_at else 0,
+            round(self.next_due + offset, 1) if self.next_due else 0,
+        ], separators=(",", ":"))
+
+    @classmethod
+    def load(cls, raw: str, offset: float) -> Optional["InstanceRecord"]:
+        try:
+            version, status, owner_jid, number, state, qr_hash, checked_at, next_due = json.loads(raw)
+        except (ValueError, TypeError):
+            return None
+        if version != _STATE_VERSION:
+            return None
+        rec = cls(status, owner_jid, number)
+        rec.state, rec.qr_hash = state, qr_hash
+        rec.checked_at = checked_at - offset if checked_at else 0.0
+        rec.next_due = next_due - offset if next_due else 0.0
+        return rec
+
+
+class FleetSnapshot:
+    def __init__(self, recheck_after: float = None):
+        # Mesmo sem mudanças, reconsulta conectadas após este intervalo (s)
+        self.recheck_after = config.SCAN_FORCE_RECHECK if recheck_after is None else recheck_after
+        self._records: Dict[str, InstanceRecord] = {}
+        self._dirty: Set[str] = set()     # alterados desde o último save()
+        self._removed: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def changed(self, fleet: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Instâncias cuja fingerprint atual difere da última checagem (inclui novas).
+        """
+        with self._lock:
+            out = []
+            for name, item in fleet.items():
+                rec = self._records.get(name)
+                if rec is None or not rec.state or rec.fingerprint != fingerprint(item):
+                    out.append(name)
+            return out
+
+    def forget_missing(self, names: Iterable[str], fleet: Iterable[str] = None):
+        """
+        Descarta os registros fora de `names`. Do Redis só sai o que também não está
+        em `fleet` (a frota inteira; no modo fragmentado o resto é de outras réplicas).
+        """
+        keep = set(names)
+        everywhere = keep if fleet is None else fleet
+        with self._lock:
+            for name in set(self._records) - keep:
+                del self._records[name]
+                self._dirty.discard(name)
+                if name not in everywhere:
+                    self._removed.add(name)
+
+    def invalidate(self, name: str):
+        """
+        Força a próxima checagem da instância (ex.: evento de webhook recebido).
+        """
+        with self._lock:
+            rec = self._records.get(name)
+            if rec is not None:
+                rec.state = ""
+                self._dirty.add(name)
+
+    def needs_check(self, item: Dict[str, Any], now: float) -> bool:
+        """
+        False somente para instância conectada, inalterada e checada recentemente.
+        """
+        fp = fingerprint(item)
+        with self._lock:
+            rec = self._records.get(item.get("name"))
+            if rec is None or rec.fingerprint != fp:
+                return True
+            if rec.state != "connected":
+                return True
+            if fp[0] not in ("open", "connected"):
+                return True
+            return now - rec.checked_at >= self.recheck_after
+
+    def numbers(self, item: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        (número cadastrado, número do ownerJid) normalizados, reaproveitando o registro.
+        """
+        fp = fingerprint(item)
+        with self._lock:
+            rec = self._records.get(item.get("name"))
+            if rec is not None and rec.number == fp[2] and rec.owner_jid == fp[1]:
+                return rec.instance_number, rec.owner_number
+        return normalize_number(fp[2]), normalize_number(number_from_owner_jid(fp[1]))
+
+    def state_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for rec in self._records.values():
+                if rec.state:
+                    counts[rec.state] = counts.get(rec.state, 0) + 1
+        return counts
+
+    def record(self, item: Dict[str, Any], state: str, now: float, qr_hash: str = None,
+               next_due: float = None) -> str:
+        """
+        Grava o resultado da checagem. Retorna o estado anterior ("" = nunca checada).
+        """
+        name = item.get("name")
+        with self._lock:
+            rec = self._records.get(name)
+            if rec is None:
+                rec = self._records[name] = InstanceRecord(*fingerprint(item))
+            else:
+                rec.set_fingerprint(fingerprint(item))
+            previous, rec.state = rec.state, state
+            rec.checked_at = now
+            if qr_hash is not None:
+                rec.qr_hash = qr_hash
+            if next_due is not None:
+                rec.next_due = next_due
+            self._dirty.add(name)
+            return previous
+
+    def reschedule(self, name: str, next_due: float):
+        """
+        Atualiza só o próximo vencimento (instância pulada sem consulta ao upstream).
+        """
+        with self._lock:
+            rec = self._records.get(name)
+            if rec is not None:
+                rec.next_due = next_due
+                self._dirty.add(name)
+
+    def due_times(self, names: Iterable[str]) -> Dict[str, float]:
+        """
+        Vencimentos conhecidos (monotonic) das instâncias informadas, para o agendador.
+        """
+        out: Dict[str, float] = {}
+        with self._lock:
+            for name in names:
+                rec = self._records.get(name)
+                if rec is not None and rec.next_due:
+                    out[name] = rec.next_due
+        return out
+
+    # --- persistência (warm restart) --------------------------------------------
+
+    def save(self, batch: int = 500) -> int:
+        """
+        Grava no Redis os registros alterados desde a última gravação. Retorna quantos.
+        """
+        offset = time.time() - time.monotonic()
+        with self._lock:
+            dirty = {name: self._records[name].dump(offset) for name in self._dirty if name in self._records}
+            removed = list(self._removed)
+            self._dirty.clear()
+            self._removed.clear()
+        if not dirty and not removed:
+            return 0
+        try:
+            with core_links.get_redis().pipeline(transaction=False) as p:
+                for chunk in core_links._chunks(dirty.items(), batch):
+                    p.hset(KEY_STATE, mapping=dict(chunk))
+                for chunk in core_links._chunks(removed, batch):
+                    p.hdel(KEY_STATE, *chunk)
+                p.expire(KEY_STATE, config.SCAN_STATE_TTL)
+                p.execute()
+        except redis.RedisError as e:
+            print(f"[WARN] Falha ao gravar o estado das instâncias no Redis: {e}")
+            with self._lock:
+                self._dirty.update(name for name in dirty if name in self._records)
+                self._removed.update(removed)
+            return 0
+        return len(dirty)
+
+    def load(self) -> int:
+        """
+        Restaura a tabela gravada por uma execução anterior. Retorna quantos registros.
+        """
+        offset = time.time() - time.monotonic()
+        records: Dict[str, InstanceRecord] = {}
+        try:
+            for name, raw in core_links.get_redis().hscan_iter(KEY_STATE, count=1000):
+                rec = InstanceRecord.load(raw, offset)
+                if rec is not None:
+                    records[name] = rec
+        except redis.RedisError as e:
+            print(f"[WARN] Falha ao ler o estado das instâncias do Redis: {e}")
+            return 0
+        with self._lock:
+            self._records.update(records)
+        return len(records)
@@ -0,0 +1,9 @@
+# worker.py
+# Ponto de entrada do worker da fila de envio de links (use com OUTBOX_INLINE_WORKER=0 no scanner).
+from modules_scan import config, metrics
+from modules_scan.outbox import OutboxWorker
+
+if __name__ == "__main__":
+    if config.OUTBOX_METRICS_PORT:
+        metrics.start_http_server(config.OUTBOX_METRICS_PORT)
+    OutboxWorker().run()